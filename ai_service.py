@@ -1,11 +1,81 @@
+import re
 import json
 import os
 import logging
-from typing import Dict, Optional, List
-from openai import OpenAI
+from typing import Awaitable, Callable, Dict, Optional, List
+from openai import OpenAI, AsyncOpenAI
+import httpx
 import requests
 from config import Config, MESSAGES
 
+class _ResponseStreamParser:
+    """Incrementally extracts the "response" string from a streamed JSON reply
+
+    The model is asked for a JSON object; while it streams, only the value of
+    its "response" field is user-visible. Replies that do not start with "{"
+    (local models sometimes ignore the format) are passed through as plain text.
+    """
+
+    _FIELD_RE = re.compile(r'"response"\s*:\s*"')
+    _ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f', '"': '"', '\\': '\\', '/': '/'}
+
+    def __init__(self):
+        self.raw = ''
+        self.text = ''
+        self._mode = None  # None until detected, then 'json' or 'plain'
+        self._pos = 0      # next raw index to decode inside the string
+        self._done = False
+
+    def feed(self, chunk: str) -> str:
+        """Add raw model output, return the visible text so far"""
+        self.raw += chunk
+        if self._mode is None:
+            stripped = self.raw.lstrip()
+            if not stripped:
+                return self.text
+            self._mode = 'json' if stripped.startswith('{') else 'plain'
+
+        if self._mode == 'plain':
+            self.text = self.raw.lstrip()
+            return self.text
+
+        if self._done:
+            return self.text
+        if not self._pos:
+            match = self._FIELD_RE.search(self.raw)
+            if not match:
+                return self.text
+            self._pos = match.end()
+
+        raw, pos, out = self.raw, self._pos, []
+        while pos < len(raw):
+            char = raw[pos]
+            if char == '"':
+                self._done = True
+                break
+            if char != '\\':
+                out.append(char)
+                pos += 1
+                continue
+            # Escape sequence; wait for the rest if it was split across chunks
+            if pos + 1 >= len(raw):
+                break
+            code = raw[pos + 1]
+            if code == 'u':
+                if pos + 6 > len(raw):
+                    break
+                try:
+                    out.append(chr(int(raw[pos + 2:pos + 6], 16)))
+                except ValueError:
+                    pass
+                pos += 6
+            else:
+                out.append(self._ESCAPES.get(code, code))
+                pos += 2
+        self._pos = pos
+        self.text += ''.join(out)
+        return self.text
+
 class AIService:
     """AI service for handling customer conversations"""
     
@@ -33,11 +103,13 @@ class AIService:
                 raise ValueError("Neither local AI nor OpenAI API key is configured")
             
             self.client = OpenAI(api_key=self.api_key)
+            self.async_client = AsyncOpenAI(api_key=self.api_key)
             self.model = Config.AI_MODEL
             logging.info("AI Service initialized with OpenAI GPT-4o")
         
         self.max_tokens = Config.AI_MAX_TOKENS
         self.temperature = Config.AI_TEMPERATURE
+        self._http: Optional[httpx.AsyncClient] = None  # for streaming from Ollama
     
     def generate_response(self, user_message: str, conversation_context: List[Dict] = None, language: str = 'fa') -> Dict:
         """
@@ -61,6 +133,113 @@ class AIService:
             logging.error(f"AI service error: {e}")
             return self._fallback_response(language)
     
+    async def generate_response_stream(self, user_message: str, conversation_context: List[Dict] = None,
+                                       language: str = 'fa',
+                                       on_text: Callable[[str], Awaitable[None]] = None) -> Dict:
+        """
+        Stream an AI response, reporting the visible text as it grows
+        
+        Args:
+            user_message: The user's message
+            conversation_context: Previous messages in the conversation
+            language: Language code ('fa' or 'en')
+            on_text: Awaited with the accumulated response text after each chunk
+        
+        Returns:
+            Same dict as generate_response, built from the complete reply
+        """
+        parser = _ResponseStreamParser()
+        try:
+            if self.use_local_ai:
+                chunks = self._stream_local_response(user_message, conversation_context, language)
+                default_confidence = 0.7
+            else:
+                chunks = self._stream_openai_response(user_message, conversation_context, language)
+                default_confidence = 0.5
+
+            shown = ''
+            async for chunk in chunks:
+                text = parser.feed(chunk)
+                if on_text and text != shown:
+                    shown = text
+                    await on_text(text)
+
+            return self._parse_response_text(parser.raw, default_confidence)
+
+        except Exception as e:
+            logging.error(f"AI streaming error: {e}")
+            return self._fallback_response(language)
+
+    async def _stream_openai_response(self, user_message: str, conversation_context: List[Dict], language: str):
+        """Yield raw content chunks from OpenAI"""
+        messages = self._build_conversation_context(user_message, conversation_context, language)
+
+        stream = await self.async_client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=self.max_tokens,
+            temperature=self.temperature,
+            response_format={"type": "json_object"},
+            stream=True
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def _stream_local_response(self, user_message: str, conversation_context: List[Dict], language: str):
+        """Yield raw response chunks from Ollama's NDJSON stream"""
+        if self._http is None:
+            self._http = httpx.AsyncClient(timeout=httpx.Timeout(30, connect=5))
+
+        ollama_request = {
+            "model": self.local_model,
+            "prompt": self._build_local_prompt(user_message, conversation_context, language),
+            "stream": True,
+            "options": {
+                "temperature": self.temperature,
+                "num_predict": self.max_tokens
+            }
+        }
+
+        async with self._http.stream('POST', f"{self.ollama_url}/api/generate", json=ollama_request) as response:
+            if response.status_code != 200:
+                raise Exception(f"Ollama request failed: {response.status_code}")
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                data = json.loads(line)
+                if data.get('response'):
+                    yield data['response']
+                if data.get('done'):
+                    break
+
+    async def aclose(self):
+        """Close the streaming HTTP client"""
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def _parse_response_text(self, response_text: str, default_confidence: float) -> Dict:
+        """Structure a complete reply; non-JSON replies become a plain response"""
+        try:
+            ai_response = json.loads(response_text)
+            return {
+                'response': ai_response.get('response', response_text),
+                'confidence': max(0.0, min(1.0, ai_response.get('confidence', default_confidence))),
+                'should_escalate': ai_response.get('should_escalate', False),
+                'intent': ai_response.get('intent', 'general_inquiry'),
+                'suggested_actions': ai_response.get('suggested_actions', [])
+            }
+        except (json.JSONDecodeError, AttributeError):
+            # If not JSON, treat as plain response
+            return {
+                'response': response_text.strip(),
+                'confidence': default_confidence,
+                'should_escalate': False,
+                'intent': 'general_inquiry',
+                'suggested_actions': []
+            }
+
     def _generate_openai_response(self, user_message: str, conversation_context: List[Dict], language: str) -> Dict:
         """Generate response using OpenAI"""
         # Build conversation history
@@ -115,24 +294,7 @@ class AIService:
         response_text = ollama_response.get('response', '')
         
         # Try to parse as JSON, fallback to plain text
-        try:
-            ai_response = json.loads(response_text)
-            return {
-                'response': ai_response.get('response', response_text),
-                'confidence': max(0.0, min(1.0, ai_response.get('confidence', 0.7))),
-                'should_escalate': ai_response.get('should_escalate', False),
-                'intent': ai_response.get('intent', 'general_inquiry'),
-                'suggested_actions': ai_response.get('suggested_actions', [])
-            }
-        except json.JSONDecodeError:
-            # If not JSON, treat as plain response
-            return {
-                'response': response_text,
-                'confidence': 0.7,
-                'should_escalate': False,
-                'intent': 'general_inquiry',
-                'suggested_actions': []
-            }
+        return self._parse_response_text(response_text, 0.7)
     
     def _build_local_prompt(self, user_message: str, context: List[Dict], language: str) -> str:
         """Build prompt for local AI model"""
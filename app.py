@@ -1,6 +1,8 @@
 import os
+import hmac
+from functools import wraps
+import json
 import logging
-from aiogram.fsm.storage.memory import MemoryStorage
 from quart import Quart, request, current_app, jsonify
 import datetime
 from asyncio import to_thread
@@ -11,17 +13,12 @@ import threading
 from flask_migrate import Migrate
 import asyncio
 from telegram import Update
+from telegram.constants import MessageLimit
 from telegram.ext import ApplicationBuilder, ContextTypes, CommandHandler
-from aiogram.types import Update
+from config import Config
+from woocommerce_webhooks import verify_signature, PRODUCT_TOPICS, ORDER_TOPICS
 
 
-TOKEN = os.getenv("BOT_TOKEN") or "7540724852:AAG-TfeGVGmssW4K3MLKkyiwwOyyqlsCGPI"
-bot = Bot(token=TOKEN)
-dp = Dispatcher(storage=MemoryStorage())
-
-
-# TOKEN = "7540724852:AAG-TfeGVGmssW4K3MLKkyiwwOyyqlsCGPI"
-
 # create the app
 app = Quart(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
@@ -47,6 +44,18 @@ migrate = Migrate(app, db)
 analytics_service = None
 bot_instance = None
 
+def require_admin(view):
+    """Reject requests without the admin API token (X-Admin-Token header)"""
+    @wraps(view)
+    async def wrapper(*args, **kwargs):
+        token = Config.ADMIN_API_TOKEN
+        if not token:
+            return jsonify({'error': 'Admin API is disabled (ADMIN_API_TOKEN not set)'}), 403
+        if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token):
+            return jsonify({'error': 'Unauthorized'}), 401
+        return await view(*args, **kwargs)
+    return wrapper
+
 @app.route('/')
 async def dashboard():
     """Main dashboard page"""
@@ -151,7 +160,14 @@ async def api_bot_status():
         status = {
             'running': bot_instance is not None,
             'uptime': uptime_str,
-            'messages_processed': messages_processed
+            'messages_processed': messages_processed,
+            'updates': bot_instance.update_processor.stats() if bot_instance else None,
+            'users': bot_instance.users.stats() if bot_instance else None,
+            'events': bot_instance.events.stats() if bot_instance else None,
+            'conversations': bot_instance.conversations.stats() if bot_instance else None,
+            'sessions': bot_instance.sessions.stats() if bot_instance else None,
+            'file_ids': bot_instance.file_ids.stats() if bot_instance else None,
+            'broadcasts': bot_instance.broadcasts.stats() if bot_instance else None
         }
         return jsonify(status)
     except Exception as e:
@@ -228,29 +244,196 @@ async def database_status():
         }), 500
 
 
-@app.post(f"/{TOKEN}")
-async def webhook_handler():
+@app.route('/api/catalog/status')
+async def api_catalog_status():
+    """Local catalog mirror freshness"""
     try:
-        data = await request.get_json()
-        update = Update.model_validate(data)
-        await dp._process_update(update)
+        if not bot_instance:
+            return jsonify({'error': 'Bot not initialized'}), 500
+
+        return jsonify(bot_instance.catalog.status())
     except Exception as e:
-        logging.exception("Webhook error")
-    return "ok"
+        logging.error(f"Error in api_catalog_status: {e}")
+        return jsonify({'error': str(e)}), 500
 
-# تنظیم Webhook در on_startup
-@app.before_serving
-async def on_startup():
-    webhook_url = f"https://{os.getenv('RENDER_EXTERNAL_HOSTNAME')}/{TOKEN}"
-    await bot.set_webhook(webhook_url)
-    logging.info(f"Webhook set: {webhook_url}")
 
-# حذف Webhook در shutdown
+@app.post('/api/catalog/resync')
+@require_admin
+async def api_catalog_resync():
+    """Start a full resync of the local catalog mirror in the background"""
+    try:
+        if not bot_instance:
+            return jsonify({'error': 'Bot not initialized'}), 500
+
+        started = bot_instance.catalog.start_resync(bot_instance.woo_api)
+        return jsonify({'started': started, **bot_instance.catalog.status()}), 202
+    except Exception as e:
+        logging.error(f"Error in api_catalog_resync: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/cache/stats')
+async def api_cache_stats():
+    """WooCommerce response cache counters"""
+    try:
+        if not bot_instance:
+            return jsonify({'error': 'Bot not initialized'}), 500
+
+        return jsonify(bot_instance.woo_api.cache_stats())
+    except Exception as e:
+        logging.error(f"Error in api_cache_stats: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/woocommerce/stats')
+async def api_woocommerce_stats():
+    """WooCommerce client counters (cache, request coalescing)"""
+    try:
+        if not bot_instance:
+            return jsonify({'error': 'Bot not initialized'}), 500
+
+        return jsonify(bot_instance.woo_api.stats())
+    except Exception as e:
+        logging.error(f"Error in api_woocommerce_stats: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.post('/api/broadcasts')
+@require_admin
+async def api_start_broadcast():
+    """Start a broadcast to users filtered by language and recent activity"""
+    try:
+        if not bot_instance:
+            return jsonify({'error': 'Bot not initialized'}), 500
+
+        data = await request.get_json(silent=True) or {}
+        text = (data.get('text') or '').strip()
+        if not text:
+            return jsonify({'error': 'text is required'}), 400
+        if len(text) > MessageLimit.MAX_TEXT_LENGTH:
+            return jsonify({'error': f"text must be at most {MessageLimit.MAX_TEXT_LENGTH} characters"}), 400
+
+        active_days = data.get('active_days')
+        if active_days not in (None, ''):
+            try:
+                active_days = int(active_days)
+            except (TypeError, ValueError):
+                return jsonify({'error': 'active_days must be a whole number of days'}), 400
+            if active_days <= 0:
+                return jsonify({'error': 'active_days must be positive'}), 400
+        else:
+            active_days = None
+
+        parse_mode = data.get('parse_mode') or None
+        if parse_mode not in (None, 'HTML', 'Markdown', 'MarkdownV2'):
+            return jsonify({'error': 'parse_mode must be HTML, Markdown or MarkdownV2'}), 400
+
+        language = data.get('language') or None
+        if language not in (None, *Config.SUPPORTED_LANGUAGES):
+            return jsonify({'error': f"language must be one of {', '.join(Config.SUPPORTED_LANGUAGES)}"}), 400
+
+        job = bot_instance.broadcasts.start_broadcast(
+            text,
+            language=language,
+            active_days=active_days,
+            parse_mode=parse_mode
+        )
+        return jsonify(job.progress()), 202
+    except Exception as e:
+        logging.error(f"Error in api_start_broadcast: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/broadcasts')
+@require_admin
+async def api_list_broadcasts():
+    """Recent broadcasts with progress"""
+    try:
+        if not bot_instance:
+            return jsonify({'error': 'Bot not initialized'}), 500
+
+        return jsonify(bot_instance.broadcasts.list_jobs())
+    except Exception as e:
+        logging.error(f"Error in api_list_broadcasts: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/api/broadcasts/<job_id>')
+@require_admin
+async def api_broadcast_progress(job_id):
+    """Progress of one broadcast"""
+    if not bot_instance:
+        return jsonify({'error': 'Bot not initialized'}), 500
+
+    job = bot_instance.broadcasts.get(job_id)
+    if not job:
+        return jsonify({'error': 'Broadcast not found'}), 404
+    return jsonify(job.progress())
+
+
+@app.post('/api/broadcasts/<job_id>/cancel')
+@require_admin
+async def api_cancel_broadcast(job_id):
+    """Cancel a running broadcast"""
+    if not bot_instance:
+        return jsonify({'error': 'Bot not initialized'}), 500
+
+    return jsonify({'cancelled': bot_instance.broadcasts.cancel(job_id)})
+
+
+@app.post('/webhooks/woocommerce')
+async def woocommerce_webhook():
+    """Receive WooCommerce product/order webhooks and push them into the bot caches"""
+    body = await request.get_data()
+    topic = request.headers.get('X-WC-Webhook-Topic')
+
+    # WooCommerce sends an unsigned ping when a webhook is created
+    if not topic:
+        return jsonify({'status': 'ok'})
+
+    if not verify_signature(body, request.headers.get('X-WC-Webhook-Signature'), Config.WOOCOMMERCE_WEBHOOK_SECRET):
+        logging.warning(f"Rejected WooCommerce webhook with invalid signature: {topic}")
+        return jsonify({'error': 'invalid signature'}), 401
+
+    if topic not in PRODUCT_TOPICS and topic not in ORDER_TOPICS:
+        return jsonify({'status': 'ignored'})
+
+    try:
+        if bot_instance:
+            payload = json.loads(body)
+            await bot_instance.apply_store_event(topic, payload)
+        return jsonify({'status': 'ok'})
+    except Exception as e:
+        logging.error(f"Error handling WooCommerce webhook {topic}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.post(Config.TELEGRAM_WEBHOOK_PATH)
+async def telegram_webhook():
+    """Receive Telegram updates and hand them to the bot's update queue"""
+    # Without a configured secret nothing can be verified, so nothing is accepted
+    secret = Config.TELEGRAM_WEBHOOK_SECRET or ''
+    if not secret or not hmac.compare_digest(request.headers.get('X-Telegram-Bot-Api-Secret-Token', ''), secret):
+        logging.warning("Rejected Telegram webhook with invalid secret token")
+        return jsonify({'error': 'invalid secret token'}), 401
+
+    if not bot_instance:
+        return jsonify({'error': 'Bot not initialized'}), 503
+
+    try:
+        data = await request.get_json(force=True)
+        await bot_instance.enqueue_update(data)
+    except Exception as e:
+        logging.error(f"Error queueing Telegram update: {e}")
+    # Handlers run from the queue; Telegram only needs the acknowledgement
+    return jsonify({'status': 'ok'})
+
 @app.after_serving
 async def on_shutdown():
-    await bot.delete_webhook()
-    await bot.session.close()
-    
+    """Stop the bot's workers when the web tier shuts down"""
+    if bot_instance and Config.TELEGRAM_UPDATE_MODE == 'webhook':
+        await bot_instance.stop_webhook()
+
 
 async def init_services():
     """Initialize services after app context is available"""
@@ -322,8 +505,8 @@ async def start_bot():
 
         from bot import TelegramBot
         bot_instance = TelegramBot(db, analytics_service)
-        # اگر bot_instance نیاز به start() دارد و آن تابع async است:
-        # await bot_instance.start()
+        if Config.TELEGRAM_UPDATE_MODE == 'webhook':
+            await bot_instance.start_webhook()
     except Exception as e:
         logging.error(f"Failed to start Telegram bot: {e}")
 
@@ -1,22 +1,42 @@
 
 import logging
 import asyncio
-from telegram import Update, ReplyKeyboardMarkup, InlineKeyboardMarkup, InlineKeyboardButton
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
+from telegram import Update, ReplyKeyboardMarkup, InlineKeyboardMarkup, InlineKeyboardButton, InputMediaPhoto
+from telegram import InlineQueryResultArticle, InputTextMessageContent
+from telegram import Message as TelegramMessage
+from telegram.error import BadRequest
+from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, InlineQueryHandler, filters, ContextTypes
 from telegram.constants import ChatAction
 from datetime import datetime
-import threading
-import time
 from app import app
 from config import Config, MESSAGES
-from models import User, Conversation, Message, UserInteraction, ProductView, OrderTracking, ConversationStatus
+from models import User
 from ai_service import AIService
-from woocommerce_api import WooCommerceAPI
-import os
+from repository import BotRepository
+from event_sink import EventSink
+from user_cache import UserCache
+from conversation_cache import ConversationCache
+from woocommerce_api import AsyncWooCommerceAPI
+from catalog_store import CatalogStore
+from search_index import ProductSearchIndex
+from cache import TTLCache
+from persian_text import normalize
+from update_processor import ChatOrderedUpdateProcessor
+from session_store import create_session_store
+from streaming_reply import StreamingReply
+from send_queue import TelegramSendQueue
+from broadcast import BroadcastEngine
+from file_id_store import FileIdStore
+import callback_data
+from product_record import POPULAR, PRICE_ASC, PRICE_DESC, NEWEST
+from intent_router import IntentRouter, ORDER_TRACKING, SUPPORT_REQUEST, CATEGORY_BROWSE
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Telegram's limit for a photo caption
+MAX_CAPTION_LENGTH = 1024
+
 class TelegramBot:
     """Main Telegram Bot class"""
 
@@ -27,14 +47,50 @@ class TelegramBot:
 
         self.db = db
         self.analytics_service = analytics_service
+        self.repository = BotRepository()
+        self.events = EventSink(self.repository)
+        self.users = UserCache(self.repository)
+        self.conversations = ConversationCache()
         self.ai_service = AIService()
-        self.woo_api = WooCommerceAPI()
+        self.woo_api = AsyncWooCommerceAPI()
+        self.catalog = CatalogStore()
+        self._catalog_task = None
+        self._background_tasks = set()
+
+        # Local full-text product search over the catalog mirror
+        self.search_index = ProductSearchIndex()
+        if self.catalog.is_loaded:
+            self.search_index.rebuild(self.catalog.all_products())
+        self.catalog.add_listener(self._on_catalog_change)
+
+        # Telegram file_ids of product images already uploaded
+        self.file_ids = FileIdStore()
+
+        # Rendered message text + keyboard for browse views
+        self.render_cache = TTLCache(max_size=Config.RENDER_CACHE_MAX_SIZE, default_ttl=Config.RENDER_CACHE_TTL)
+
+        # Inline-query result pages, per normalized query and catalog version
+        self.inline_cache = TTLCache(max_size=Config.INLINE_CACHE_MAX_SIZE, default_ttl=Config.INLINE_CACHE_TIME)
 
         # Initialize bot application
-        self.application = Application.builder().token(self.token).build()
+        # Updates run concurrently across chats and in order within a chat
+        self.update_processor = ChatOrderedUpdateProcessor(Config.TELEGRAM_CONCURRENT_UPDATES)
+        self.application = (
+            Application.builder()
+            .token(self.token)
+            .concurrent_updates(self.update_processor)
+            .build()
+        )
+
+        # User sessions to track conversation state (TTL-bound, optionally shared by workers)
+        self.sessions = create_session_store()
 
-        # User sessions to track conversation state
-        self.user_sessions = {}
+        # Rate-limited outbound sends and bulk announcements
+        self.send_queue = TelegramSendQueue(self.application.bot)
+        self.broadcasts = BroadcastEngine(self.repository, self.send_queue)
+
+        # Keyword intent router, compiled once
+        self.intent_router = IntentRouter()
 
         self._setup_handlers()
         logging.info("Telegram bot initialized")
@@ -50,6 +106,9 @@ class TelegramBot:
         # Callback query handler for inline keyboards
         self.application.add_handler(CallbackQueryHandler(self.button_callback))
 
+        # Inline mode: @bot <query> product search
+        self.application.add_handler(InlineQueryHandler(self.inline_query))
+
         # Message handlers
         self.application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handle_message))
 
@@ -144,30 +203,56 @@ class TelegramBot:
             logging.error(f"Error in support_command: {e}")
             await update.message.reply_text("متأسفانه خطایی رخ داده است. لطفاً دوباره تلاش کنید.")
     async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        user = update.effective_user
-        message_text = update.message.text.strip()
-
-        logging.info(f"[START] Received message from {user.id}: {message_text}")
-
+        """Handle text messages"""
         try:
-            await self._save_message(user.id, message_text)
-            logging.info(f"[OK] Message saved")
-
-            language = await self.get_user_language(user.id)
-            logging.info(f"[OK] Language fetched: {language}")
-
-            if re.search(r"(پیگیری سفارش|وضعیت سفارش)", message_text):
-                logging.info("[ACTION] Order tracking path triggered")
-                await self._handle_order_tracking(update, context, language)
-            elif re.search(r"(پشتیبان|انسان|پاسخگو)", message_text):
-                logging.info("[ACTION] Escalate to human")
-                await self._escalate_to_human(update, context, language)
+            user = await self._get_or_create_user(update.effective_user)
+            language = user.language_code or 'fa'
+            message_text = update.message.text.strip()
+
+            # Get or create conversation and save user message
+            conversation_id = await self._get_or_create_conversation_id(user, with_context=True)
+            await self._save_message(conversation_id, message_text, is_from_user=True,
+                                     telegram_message_id=update.message.message_id)
+
+            # Check if user is providing order number
+            session = await self.sessions.pop(user.telegram_id)
+            if session and session.get('waiting_for_order_number'):
+                order_number = self.intent_router.extract_order_number(message_text) or message_text
+                await self._handle_order_tracking(update, user, order_number, language)
+                return
+
+            # Route locally; only ambiguous messages go to the model
+            intent_analysis = self.intent_router.route(message_text)
+            source = 'router'
+            if intent_analysis is None:
+                await context.bot.send_chat_action(chat_id=update.effective_chat.id, action=ChatAction.TYPING)
+                loop = asyncio.get_running_loop()
+                intent_analysis = await loop.run_in_executor(
+                    None, self.ai_service.analyze_intent, message_text, language
+                )
+                source = 'ai'
+
+            intent = intent_analysis['intent']
+            if intent == ORDER_TRACKING:
+                order_number = intent_analysis.get('entities', {}).get('order_number')
+                if order_number:
+                    await self._handle_order_tracking(update, user, str(order_number), language)
+                else:
+                    await self._prompt_for_order_number(update, user, language)
+            elif intent in (SUPPORT_REQUEST, 'complaint'):
+                await self._escalate_to_human(update, user, language)
+            elif intent == CATEGORY_BROWSE:
+                await self._show_categories(update, language)
             else:
-                logging.info("[ACTION] Product inquiry")
-                await self._handle_product_inquiry(update, context, language)
+                await self._handle_product_inquiry(update, user, message_text, language)
+
+            await self._track_interaction(user.id, 'message_routed', {
+                'intent': intent,
+                'source': source
+            })
 
         except Exception as e:
-            logging.error(f"[ERROR] in handle_message: {e}")
+            logging.error(f"Error in handle_message: {e}")
             await update.message.reply_text("متأسفانه خطایی رخ داده است. لطفاً دوباره تلاش کنید.")
 
     # async def handle_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -255,8 +340,23 @@ class TelegramBot:
             language = user.language_code or 'fa'
 
             data = query.data
+            packed = callback_data.unpack(data)
+
+            if packed:
+                language = packed['language']
+                if packed['action'] == callback_data.CATEGORIES:
+                    await self._show_categories_inline(query, language, page=packed['page'])
+                elif packed['action'] == callback_data.CATEGORY:
+                    await self._show_category_products(query, user, packed['category_id'], language,
+                                                       page=packed['page'], sort=packed['sort'])
+                elif packed['action'] == callback_data.PRODUCT:
+                    await self._show_product_details(query, user, packed['product_id'], language,
+                                                     back=(packed['category_id'], packed['page'], packed['sort']))
+
+            elif data == 'noop':
+                pass
 
-            if data == 'show_categories':
+            elif data == 'show_categories':
                 await self._show_categories_inline(query, language)
 
             elif data == 'order_tracking':
@@ -283,6 +383,59 @@ class TelegramBot:
         except Exception as e:
             logging.error(f"Error in button_callback: {e}")
 
+    async def inline_query(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Handle @bot inline queries from the local catalog and search index only"""
+        inline_query = update.inline_query
+        try:
+            language = 'en' if (inline_query.from_user.language_code or '').startswith('en') else 'fa'
+            offset = int(inline_query.offset or 0)
+
+            key = (normalize(inline_query.query), offset, self.catalog.version, language)
+            page, _ = self.inline_cache.get(key)
+            if page is None:
+                page = self._inline_results(key[0], offset, language)
+                self.inline_cache.set(key, page)
+
+            results, next_offset = page
+            await inline_query.answer(
+                results,
+                cache_time=Config.INLINE_CACHE_TIME if self.catalog.is_loaded else 5,
+                is_personal=False,
+                next_offset=next_offset
+            )
+
+        except Exception as e:
+            logging.error(f"Error in inline_query: {e}")
+
+    def _inline_results(self, query: str, offset: int, language: str):
+        """One page of inline results: (results, next_offset)"""
+        per_page = Config.INLINE_RESULTS_PAGE_SIZE
+        if query:
+            ranked = self.search_index.search(query, limit=offset + per_page + 1)
+            products = [product for product in (self.catalog.get_product(pid) for pid, _ in ranked) if product]
+        else:
+            # Empty query: best sellers
+            products = self.catalog.get_products(per_page=offset + per_page + 1)
+
+        has_next = len(products) > offset + per_page
+        results = []
+        for product in products[offset:offset + per_page]:
+            stock = MESSAGES[language]['in_stock'] if product['stock_status'] == 'instock' else MESSAGES[language]['out_of_stock']
+            keyboard = InlineKeyboardMarkup([[InlineKeyboardButton(
+                MESSAGES[language]['view_product'], url=product['permalink']
+            )]]) if product.get('permalink') else None
+            results.append(InlineQueryResultArticle(
+                id=str(product['id']),
+                title=product['name'],
+                description=f"{MESSAGES[language]['price']} {product['price']} · {stock}",
+                input_message_content=InputTextMessageContent(
+                    self.woo_api.format_product_message(product, language), parse_mode='Markdown'
+                ),
+                reply_markup=keyboard,
+                thumbnail_url=product.get('image')
+            ))
+        return results, str(offset + per_page) if has_next else ''
+
     async def _show_main_menu(self, update: Update, language: str):
         """Show main menu keyboard"""
         try:
@@ -321,116 +474,78 @@ class TelegramBot:
     async def _show_categories(self, update: Update, language: str):
         """Show product categories"""
         try:
-            categories = self.woo_api.get_categories()
+            rendered = await self._render_categories(language)
 
-            if not categories:
+            if not rendered:
                 await update.message.reply_text(MESSAGES[language]['error'])
                 return
 
-            keyboard = []
-            for category in categories[:15]:  # Show max 15 categories
-                keyboard.append([InlineKeyboardButton(
-                    f"📂 {category['name']} ({category['count']})",
-                    callback_data=f"category_{category['id']}"
-                )])
-
-            keyboard.append([InlineKeyboardButton(MESSAGES[language]['back'], callback_data='main_menu')])
-
-            reply_markup = InlineKeyboardMarkup(keyboard)
-
-            await update.message.reply_text(
-                MESSAGES[language]['categories'],
-                reply_markup=reply_markup
-            )
+            text, reply_markup = rendered
+            await update.message.reply_text(text, reply_markup=reply_markup)
 
         except Exception as e:
             logging.error(f"Error showing categories: {e}")
             await update.message.reply_text(MESSAGES[language]['error'])
 
-    async def _show_categories_inline(self, query, language: str):
+    async def _show_categories_inline(self, query, language: str, page: int = 1):
         """Show categories with inline keyboard"""
         try:
-            categories = self.woo_api.get_categories()
+            rendered = await self._render_categories(language, page)
 
-            if not categories:
+            if not rendered:
                 await query.edit_message_text(MESSAGES[language]['error'])
                 return
 
-            keyboard = []
-            for category in categories[:15]:
-                keyboard.append([InlineKeyboardButton(
-                    f"📂 {category['name']} ({category['count']})",
-                    callback_data=f"category_{category['id']}"
-                )])
-
-            keyboard.append([InlineKeyboardButton(MESSAGES[language]['back'], callback_data='main_menu')])
-
-            reply_markup = InlineKeyboardMarkup(keyboard)
-
-            await query.edit_message_text(
-                MESSAGES[language]['categories'],
-                reply_markup=reply_markup
-            )
+            text, reply_markup = rendered
+            await self._edit_text(query, text, reply_markup=reply_markup)
 
         except Exception as e:
             logging.error(f"Error showing categories inline: {e}")
             await query.edit_message_text(MESSAGES[language]['error'])
 
-    async def _show_category_products(self, query, user: User, category_id: int, language: str):
-        """Show products in a category"""
+    async def _show_category_products(self, query, user: User, category_id: int, language: str,
+                                      page: int = 1, sort: str = POPULAR):
+        """Show a page of products in a category"""
         try:
-            products = self.woo_api.get_products(category_id=category_id, per_page=10)
+            rendered = await self._render_category_products(category_id, language, page, sort)
 
-            if not products:
-                await query.edit_message_text(MESSAGES[language]['no_products'])
+            if not rendered:
+                await self._edit_text(query, MESSAGES[language]['no_products'])
                 return
 
-            keyboard = []
-            for product in products:
-                keyboard.append([InlineKeyboardButton(
-                    f"🛍️ {product['name'][:30]}..." if len(product['name']) > 30 else f"🛍️ {product['name']}",
-                    callback_data=f"product_{product['id']}"
-                )])
+            text, reply_markup, has_next = rendered
+            await self._edit_text(query, text, reply_markup=reply_markup)
 
-            keyboard.append([InlineKeyboardButton(MESSAGES[language]['back'], callback_data='show_categories')])
-
-            reply_markup = InlineKeyboardMarkup(keyboard)
-
-            await query.edit_message_text(
-                f"🛍️ محصولات" if language == 'fa' else "🛍️ Products",
-                reply_markup=reply_markup
-            )
+            # Warm the next page so paging forward is instant
+            if has_next:
+                self._spawn(self._render_category_products(category_id, language, page + 1, sort))
 
             # Track category view
-            await self._track_interaction(user.id, 'category_browse', {'category_id': category_id})
+            await self._track_interaction(user.id, 'category_browse', {
+                'category_id': category_id, 'page': page, 'sort': sort
+            })
 
         except Exception as e:
             logging.error(f"Error showing category products: {e}")
             await query.edit_message_text(MESSAGES[language]['error'])
 
-    async def _show_product_details(self, query, user: User, product_id: int, language: str):
+    async def _show_product_details(self, query, user: User, product_id: int, language: str,
+                                    back: tuple = (0, 1, POPULAR)):
         """Show detailed product information"""
         try:
-            product = self.woo_api.get_product(product_id)
+            product = await self._get_product(product_id)
 
             if not product:
                 await query.edit_message_text(MESSAGES[language]['error'])
                 return
 
-            # Format product message
-            product_message = self.woo_api.format_product_message(product, language)
-
-            keyboard = [
-                [InlineKeyboardButton(MESSAGES[language]['back'], callback_data='show_categories')]
-            ]
+            text, reply_markup = self._render_product(product, language, back)
 
-            reply_markup = InlineKeyboardMarkup(keyboard)
-
-            await query.edit_message_text(
-                product_message,
-                reply_markup=reply_markup,
-                parse_mode='Markdown'
-            )
+            images = product.get('images') or []
+            image_url = images[0].get('src') if images else None
+            if not (Config.PRODUCT_PHOTOS and image_url and len(text) <= MAX_CAPTION_LENGTH
+                    and await self._show_product_photo(query, product, image_url, text, reply_markup)):
+                await self._edit_text(query, text, reply_markup=reply_markup, parse_mode='Markdown')
 
             # Track product view
             await self._track_product_view(user.id, product)
@@ -439,25 +554,250 @@ class TelegramBot:
             logging.error(f"Error showing product details: {e}")
             await query.edit_message_text(MESSAGES[language]['error'])
 
+    async def _show_product_photo(self, query, product, image_url: str, caption: str, reply_markup) -> bool:
+        """Turn the message into the product photo, reusing a cached file_id
+
+        Returns False if the photo could not be shown, so the caller falls back to text.
+        """
+        version = product.get('date_modified') or ''
+        file_id = self.file_ids.get(image_url, version)
+        try:
+            try:
+                message = await query.edit_message_media(
+                    InputMediaPhoto(file_id or image_url, caption=caption, parse_mode='Markdown'),
+                    reply_markup=reply_markup
+                )
+            except BadRequest:
+                if file_id is None:
+                    raise
+                # Telegram no longer accepts the stored id; upload from the URL again
+                await self.file_ids.invalidate(image_url)
+                file_id = None
+                message = await query.edit_message_media(
+                    InputMediaPhoto(image_url, caption=caption, parse_mode='Markdown'),
+                    reply_markup=reply_markup
+                )
+        except BadRequest as e:
+            logging.warning(f"Product photo {image_url} not shown: {e}")
+            return False
+
+        # First upload: remember the id Telegram assigned
+        if file_id is None and isinstance(message, TelegramMessage) and message.photo:
+            await self.file_ids.set(image_url, version, message.photo[-1].file_id)
+        return True
+
+    async def _edit_text(self, query, text: str, **kwargs):
+        """Edit the callback's message to text; a photo message is replaced instead"""
+        if query.message and query.message.photo:
+            await query.message.delete()
+            await query.message.chat.send_message(text, **kwargs)
+        else:
+            await query.edit_message_text(text, **kwargs)
+
+    @staticmethod
+    def _pagination_row(page: int, total_pages: int, has_next: bool, pack_page) -> list:
+        """Previous / page indicator / next buttons; total_pages may be unknown (None)"""
+        row = []
+        if page > 1:
+            row.append(InlineKeyboardButton('◀️', callback_data=pack_page(page - 1)))
+        if page > 1 or has_next:
+            label = f"{page}/{total_pages}" if total_pages else str(page)
+            row.append(InlineKeyboardButton(label, callback_data='noop'))
+        if has_next:
+            row.append(InlineKeyboardButton('▶️', callback_data=pack_page(page + 1)))
+        return row
+
+    async def _render_categories(self, language: str, page: int = 1):
+        """A page of categories: text and keyboard, cached per catalog version"""
+        key = ('categories', None, self.catalog.version, language, page)
+        if self.catalog.is_loaded:
+            rendered, _ = self.render_cache.get(key)
+            if rendered:
+                return rendered
+
+        categories = await self._get_categories()
+        if not categories:
+            return None
+
+        per_page = Config.CATEGORIES_PAGE_SIZE
+        total_pages = max(1, -(-len(categories) // per_page))
+        page = min(max(1, page), total_pages)
+        start = (page - 1) * per_page
+
+        keyboard = []
+        for category in categories[start:start + per_page]:
+            keyboard.append([InlineKeyboardButton(
+                f"📂 {category['name']} ({category['count']})",
+                callback_data=callback_data.pack_category(category['id'], 1, POPULAR, language)
+            )])
+
+        nav = self._pagination_row(page, total_pages, page < total_pages,
+                                   lambda p: callback_data.pack_categories(p, language))
+        if nav:
+            keyboard.append(nav)
+        keyboard.append([InlineKeyboardButton(MESSAGES[language]['back'], callback_data='main_menu')])
+
+        rendered = (MESSAGES[language]['categories'], InlineKeyboardMarkup(keyboard))
+        if self.catalog.is_loaded:
+            self.render_cache.set(key, rendered)
+        return rendered
+
+    async def _render_category_products(self, category_id: int, language: str, page: int = 1,
+                                        sort: str = POPULAR):
+        """A page of a category's products
+
+        Returns:
+            (text, keyboard, has_next), cached per catalog version, or None if empty
+        """
+        key = ('category', category_id, self.catalog.version, language, page, sort)
+        rendered, _ = self.render_cache.get(key)
+        if rendered:
+            return rendered
+
+        per_page = Config.PRODUCTS_PAGE_SIZE
+        if self.catalog.is_loaded:
+            total_pages = max(1, -(-self.catalog.count_products(category_id) // per_page))
+            products = self.catalog.get_products(category_id=category_id, per_page=per_page, page=page, sort=sort)
+            has_next = page < total_pages
+        else:
+            # Store fallback: total unknown, a full page means there may be more
+            total_pages = None
+            products = await self.woo_api.get_products(category_id=category_id, per_page=per_page, page=page, sort=sort)
+            has_next = len(products) == per_page
+        if not products:
+            return None
+
+        keyboard = []
+        for product in products:
+            keyboard.append([InlineKeyboardButton(
+                f"🛍️ {product['name'][:30]}..." if len(product['name']) > 30 else f"🛍️ {product['name']}",
+                callback_data=callback_data.pack_product(product['id'], category_id, page, sort, language)
+            )])
+
+        keyboard.append([
+            InlineKeyboardButton(('✅ ' if sort == option else '') + MESSAGES[language][f'sort_{option}'],
+                                 callback_data=callback_data.pack_category(category_id, 1, option, language))
+            for option in (POPULAR, PRICE_ASC, PRICE_DESC, NEWEST)
+        ])
+        nav = self._pagination_row(page, total_pages, has_next,
+                                   lambda p: callback_data.pack_category(category_id, p, sort, language))
+        if nav:
+            keyboard.append(nav)
+        keyboard.append([InlineKeyboardButton(MESSAGES[language]['back'],
+                                              callback_data=callback_data.pack_categories(1, language))])
+
+        rendered = ("🛍️ محصولات" if language == 'fa' else "🛍️ Products", InlineKeyboardMarkup(keyboard), has_next)
+        self.render_cache.set(key, rendered, ttl=None if self.catalog.is_loaded else Config.CACHE_TTLS['products'])
+        return rendered
+
+    def _render_product(self, product: dict, language: str, back: tuple = (0, 1, POPULAR)):
+        """Product details text and keyboard, cached per product version"""
+        key = ('product', product['id'], product.get('date_modified'), language, back)
+        rendered, _ = self.render_cache.get(key)
+        if rendered:
+            return rendered
+
+        category_id, page, sort = back
+        if category_id:
+            back_data = callback_data.pack_category(category_id, page, sort, language)
+        else:
+            back_data = callback_data.pack_categories(1, language)
+        keyboard = [
+            [InlineKeyboardButton(MESSAGES[language]['back'], callback_data=back_data)]
+        ]
+
+        rendered = (self.woo_api.format_product_message(product, language), InlineKeyboardMarkup(keyboard))
+        self.render_cache.set(key, rendered)
+        return rendered
+
+    def _spawn(self, coro):
+        """Run a fire-and-forget coroutine, keeping a reference until it finishes"""
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+        return task
+
+    async def _get_categories(self) -> list:
+        """Get categories from the local catalog, falling back to WooCommerce"""
+        if self.catalog.is_loaded:
+            return self.catalog.get_categories()
+        return await self.woo_api.get_categories()
+
+    async def _get_product(self, product_id: int) -> dict:
+        """Get a product from the local catalog, falling back to WooCommerce"""
+        product = self.catalog.get_product(product_id)
+        if product is None:
+            product = await self.woo_api.get_product(product_id)
+        return product
+
+    async def _search_products(self, query: str, limit: int = 5) -> list:
+        """Search the local index, falling back to WooCommerce search"""
+        if len(self.search_index):
+            results = self.search_index.search(query, limit=limit)
+            return [product for product in (self.catalog.get_product(pid) for pid, _ in results) if product]
+        return await self.woo_api.search_products(query, per_page=limit)
+
+    async def _on_catalog_change(self, changed: list, removed: list, full: bool):
+        """Keep the search index and render cache in step with the catalog mirror"""
+        if full:
+            self.render_cache.clear()
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, self.search_index.rebuild, changed)
+            return
+
+        for product in changed:
+            self.search_index.add_product(product)
+        for product_id in removed:
+            self.search_index.remove_product(product_id)
+
+        product_ids = {product['id'] for product in changed} | set(removed)
+        self.render_cache.invalidate_where(
+            lambda key: key[0] in ('categories', 'category') or (key[0] == 'product' and key[1] in product_ids)
+        )
+
+    async def apply_store_event(self, topic: str, payload: dict):
+        """Push a WooCommerce webhook event into the catalog and caches"""
+        resource, _, event = topic.partition('.')
+        object_id = payload.get('id')
+        if not object_id:
+            return
+
+        if resource == 'product':
+            self.woo_api.invalidate_product(object_id)
+            if event in ('created', 'deleted', 'restored'):
+                self.woo_api.invalidate_categories()
+
+            if event == 'deleted':
+                await self.catalog.remove_product(object_id)
+            elif self.catalog.is_loaded:
+                await self.catalog.upsert_product(payload)
+
+        elif resource == 'order':
+            if event == 'deleted':
+                self.woo_api.invalidate_order(object_id)
+            else:
+                self.woo_api.update_cached_order(payload)
+
+        logging.info(f"Applied store event {topic} for {object_id}")
+
     async def _prompt_for_order_number(self, update: Update, user: User, language: str):
         """Prompt user to enter order number"""
-        self.user_sessions[user.telegram_id] = {'waiting_for_order_number': True}
+        await self.sessions.set(user.telegram_id, {'waiting_for_order_number': True})
         await update.message.reply_text(MESSAGES[language]['order_number_prompt'])
 
     async def _prompt_for_order_number_inline(self, query, user: User, language: str):
         """Prompt user to enter order number (inline)"""
-        self.user_sessions[user.telegram_id] = {'waiting_for_order_number': True}
+        await self.sessions.set(user.telegram_id, {'waiting_for_order_number': True})
         await query.edit_message_text(MESSAGES[language]['order_number_prompt'])
 
     async def _handle_order_tracking(self, update: Update, user: User, order_number: str, language: str):
         """Handle order tracking request"""
         try:
             # Clear session
-            if user.telegram_id in self.user_sessions:
-                del self.user_sessions[user.telegram_id]
+            await self.sessions.delete(user.telegram_id)
 
             # Search for order
-            order = self.woo_api.search_order_by_number(order_number.strip())
+            order = await self.woo_api.search_order_by_number(order_number.strip())
 
             if order:
                 order_message = self.woo_api.format_order_message(order, language)
@@ -476,14 +816,14 @@ class TelegramBot:
         """Handle product-related inquiries"""
         try:
             # Search for products based on the message
-            products = self.woo_api.search_products(message_text, per_page=5)
+            products = await self._search_products(message_text, limit=5)
 
             if products:
                 keyboard = []
                 for product in products:
                     keyboard.append([InlineKeyboardButton(
                         f"🛍️ {product['name'][:30]}..." if len(product['name']) > 30 else f"🛍️ {product['name']}",
-                        callback_data=f"product_{product['id']}"
+                        callback_data=callback_data.pack_product(product['id'], 0, 1, POPULAR, language)
                     )])
 
                 keyboard.append([InlineKeyboardButton(MESSAGES[language]['back'], callback_data='main_menu')])
@@ -498,16 +838,26 @@ class TelegramBot:
                 )
             else:
                 # No products found, use AI to respond
-                conversation = await self._get_or_create_conversation(user)
-                conversation_context = await self._get_conversation_context(conversation.id)
-                ai_response = self.ai_service.generate_response(
-                    message_text, conversation_context, language
-                )
-
-                await update.message.reply_text(ai_response['response'])
+                conversation_id = await self._get_or_create_conversation_id(user)
+                conversation_context = await self._get_conversation_context(conversation_id)
+
+                if Config.AI_STREAMING:
+                    # Placeholder first, then edit it as the reply streams in
+                    reply = StreamingReply(update.message, MESSAGES[language]['typing'])
+                    await reply.start()
+                    ai_response = await self.ai_service.generate_response_stream(
+                        message_text, conversation_context, language, on_text=reply.update
+                    )
+                    await reply.finish(ai_response['response'])
+                else:
+                    loop = asyncio.get_running_loop()
+                    ai_response = await loop.run_in_executor(
+                        None, self.ai_service.generate_response, message_text, conversation_context, language
+                    )
+                    await update.message.reply_text(ai_response['response'])
 
                 # Save AI response
-                await self._save_message(conversation.id, ai_response['response'], 
+                await self._save_message(conversation_id, ai_response['response'], 
                                         is_from_user=False, is_ai_response=True, 
                                         ai_confidence=ai_response['confidence'])
 
@@ -519,11 +869,10 @@ class TelegramBot:
         """Escalate conversation to human support"""
         try:
             # Mark current conversation as escalated
-            conversation = await self._get_or_create_conversation(user)
+            conversation_id = await self._get_or_create_conversation_id(user)
 
-            # Use asyncio to handle database operations
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(None, self._update_conversation_status, conversation.id)
+            await self.repository.escalate_conversation(conversation_id)
+            self.conversations.end_conversation(user.id)
 
             escalation_message = MESSAGES[language]['escalating_to_human']
             support_message = MESSAGES[language]['human_support_message']
@@ -543,11 +892,10 @@ class TelegramBot:
     async def _escalate_to_human_inline(self, query, user: User, language: str):
         """Escalate to human support (inline)"""
         try:
-            conversation = await self._get_or_create_conversation(user)
+            conversation_id = await self._get_or_create_conversation_id(user)
 
-            # Use asyncio to handle database operations
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(None, self._update_conversation_status, conversation.id)
+            await self.repository.escalate_conversation(conversation_id)
+            self.conversations.end_conversation(user.id)
 
             support_message = MESSAGES[language]['human_support_message']
 
@@ -559,15 +907,6 @@ class TelegramBot:
         except Exception as e:
             logging.error(f"Error escalating to human inline: {e}")
 
-    def _update_conversation_status(self, conversation_id):
-        """Update conversation status in database (sync function for executor)"""
-        with self.db.session() as session:
-            conv = session.get(Conversation, conversation_id)
-            if conv:
-                conv.status = ConversationStatus.ESCALATED
-                conv.escalated_at = datetime.utcnow()
-                session.commit()
-
     async def _request_rating(self, update: Update, user: User, language: str):
         """Request conversation rating from user"""
         try:
@@ -590,11 +929,11 @@ class TelegramBot:
         """Handle conversation rating"""
         try:
             # Save rating to current conversation
-            conversation = await self._get_current_conversation(user)
+            conversation_id = await self._get_current_conversation_id(user)
 
-            if conversation:
-                loop = asyncio.get_event_loop()
-                await loop.run_in_executor(None, self._save_rating, conversation.id, rating)
+            if conversation_id:
+                await self.repository.save_rating(conversation_id, rating)
+                self.conversations.end_conversation(user.id)
 
             thank_you = "ممنون از امتیاز شما! 🙏" if language == 'fa' else "Thank you for your rating! 🙏"
 
@@ -606,173 +945,69 @@ class TelegramBot:
         except Exception as e:
             logging.error(f"Error handling rating: {e}")
 
-    def _save_rating(self, conversation_id, rating):
-        """Save rating to database (sync function for executor)"""
-        with self.db.session() as session:
-            conv = session.get(Conversation, conversation_id)
-            if conv:
-                conv.satisfaction_rating = rating
-                conv.ended_at = datetime.utcnow()
-                conv.status = 'resolved'
-                session.commit()
-
     async def _get_or_create_user(self, telegram_user) -> User:
-        """Get or create user from Telegram user object"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self._sync_get_or_create_user, telegram_user)
-
-    def _sync_get_or_create_user(self, telegram_user) -> User:
-        """Sync version of get or create user"""
-        with self.db.session() as session:
-            user = session.query(User).filter_by(telegram_id=telegram_user.id).first()
-
-            if not user:
-                user = User(
-                    telegram_id=telegram_user.id,
-                    username=telegram_user.username,
-                    first_name=telegram_user.first_name,
-                    last_name=telegram_user.last_name,
-                    language_code=telegram_user.language_code or 'fa'
-                )
-                session.add(user)
-                session.commit()
-                session.refresh(user)
-            else:
-                # Update last interaction
-                user.last_interaction = datetime.utcnow()
-                session.commit()
-
-            return user
-
-    async def _get_or_create_conversation(self, user: User) -> Conversation:
-        """Get active conversation or create new one"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self._sync_get_or_create_conversation, user)
-
-    def _sync_get_or_create_conversation(self, user: User) -> Conversation:
-        """Sync version of get or create conversation"""
-        with self.db.session() as session:
-            # Look for active conversation
-            conversation = session.query(Conversation).filter_by(
-                user_id=user.id,
-                status='active'
-            ).first()
-
-            if not conversation:
-                conversation = Conversation(
-                    user_id=user.id,
-                    status='active'
-                )
-                session.add(conversation)
-                session.commit()
-                session.refresh(conversation)
-
-            return conversation
-
-    async def _get_current_conversation(self, user: User) -> Conversation:
-        """Get current active conversation"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self._sync_get_current_conversation, user)
-
-    def _sync_get_current_conversation(self, user: User) -> Conversation:
-        """Sync version of get current conversation"""
-        with self.db.session() as session:
-            return session.query(Conversation).filter_by(
-                user_id=user.id,
-                status='active'
-            ).first()
+        """Get or create user from Telegram user object (cached)"""
+        return await self.users.get_or_create(telegram_user)
+
+    async def _get_or_create_conversation_id(self, user: User, with_context: bool = False) -> int:
+        """Get active conversation id (cached) or create a new conversation
+
+        With `with_context`, an existing conversation's context ring is loaded
+        now, before a new message is saved: saved messages are only queued for
+        the next batched write, so a later database read would miss them.
+        """
+        conversation_id = self.conversations.get_active(user.id)
+        created = False
+        if conversation_id is None:
+            conversation, created = await self.repository.get_or_create_conversation(user.id)
+            conversation_id = conversation.id
+            self.conversations.set_active(user.id, conversation_id, created=created)
+
+        if with_context and not created and not self.conversations.has_context(conversation_id):
+            await self._get_conversation_context(conversation_id)
+        return conversation_id
+
+    async def _get_current_conversation_id(self, user: User) -> int:
+        """Get current active conversation id (cached)"""
+        conversation_id = self.conversations.get_active(user.id)
+        if conversation_id is None:
+            conversation = await self.repository.get_current_conversation(user.id)
+            if conversation:
+                conversation_id = conversation.id
+                self.conversations.set_active(user.id, conversation_id)
+        return conversation_id
 
     async def _save_message(self, conversation_id: int, content: str, is_from_user: bool = True, 
                            telegram_message_id: int = None, is_ai_response: bool = False, 
                            ai_confidence: float = None):
-        """Save message to database"""
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(None, self._sync_save_message, conversation_id, content, 
-                                   is_from_user, telegram_message_id, is_ai_response, ai_confidence)
-
-    def _sync_save_message(self, conversation_id: int, content: str, is_from_user: bool = True, 
-                          telegram_message_id: int = None, is_ai_response: bool = False, 
-                          ai_confidence: float = None):
-        """Sync version of save message"""
-        with self.db.session() as session:
-            message = Message(
-                conversation_id=conversation_id,
-                content=content,
-                is_from_user=is_from_user,
-                telegram_message_id=telegram_message_id,
-                is_ai_response=is_ai_response,
-                ai_confidence=ai_confidence
-            )
-            session.add(message)
-            session.commit()
+        """Queue message for the next batched write and add it to the cached context"""
+        self.events.record_message(conversation_id, content, is_from_user,
+                                   telegram_message_id, is_ai_response, ai_confidence)
+        self.conversations.append_message(conversation_id, {
+            'content': content,
+            'is_from_user': is_from_user,
+            'timestamp': datetime.utcnow().isoformat()
+        })
 
     async def _get_conversation_context(self, conversation_id: int) -> list:
-        """Get conversation context for AI"""
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self._sync_get_conversation_context, conversation_id)
-
-    def _sync_get_conversation_context(self, conversation_id: int) -> list:
-        """Sync version of get conversation context"""
-        with self.db.session() as session:
-            messages = session.query(Message).filter_by(
-                conversation_id=conversation_id
-            ).order_by(Message.timestamp.desc()).limit(10).all()
-
-            return [{
-                'content': msg.content,
-                'is_from_user': msg.is_from_user,
-                'timestamp': msg.timestamp.isoformat()
-            } for msg in reversed(messages)]
+        """Get conversation context for AI, from the ring buffer when loaded"""
+        context = self.conversations.get_context(conversation_id)
+        if context is None:
+            context = await self.repository.get_conversation_context(conversation_id, limit=Config.CONVERSATION_CONTEXT_SIZE)
+            self.conversations.load_context(conversation_id, context)
+        return context
 
     async def _track_interaction(self, user_id: int, interaction_type: str, data: dict = None):
         """Track user interaction"""
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(None, self._sync_track_interaction, user_id, interaction_type, data)
-
-    def _sync_track_interaction(self, user_id: int, interaction_type: str, data: dict = None):
-        """Sync version of track interaction"""
-        with self.db.session() as session:
-            interaction = UserInteraction(
-                user_id=user_id,
-                interaction_type=interaction_type,
-                data=data or {}
-            )
-            session.add(interaction)
-            session.commit()
+        self.events.record_interaction(user_id, interaction_type, data)
 
     async def _track_product_view(self, user_id: int, product: dict):
         """Track product view"""
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(None, self._sync_track_product_view, user_id, product)
-
-    def _sync_track_product_view(self, user_id: int, product: dict):
-        """Sync version of track product view"""
-        with self.db.session() as session:
-            product_view = ProductView(
-                user_id=user_id,
-                product_id=product['id'],
-                product_name=product['name'],
-                category_id=product.get('categories', [{}])[0].get('id') if product.get('categories') else None,
-                category_name=product.get('categories', [{}])[0].get('name') if product.get('categories') else None
-            )
-            session.add(product_view)
-            session.commit()
+        self.events.record_product_view(user_id, product)
 
     async def _track_order_tracking(self, user_id: int, order_number: str, woocommerce_order_id: int = None):
         """Track order tracking request"""
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(None, self._sync_track_order_tracking, user_id, order_number, woocommerce_order_id)
-
-    def _sync_track_order_tracking(self, user_id: int, order_number: str, woocommerce_order_id: int = None):
-        """Sync version of track order tracking"""
-        with self.db.session() as session:
-            order_tracking = OrderTracking(
-                user_id=user_id,
-                order_number=order_number,
-                woocommerce_order_id=woocommerce_order_id
-            )
-            session.add(order_tracking)
-            session.commit()
+        self.events.record_order_tracking(user_id, order_number, woocommerce_order_id)
 
     async def error_handler(self, update: object, context: ContextTypes.DEFAULT_TYPE):
         """Handle errors"""
@@ -787,12 +1022,68 @@ class TelegramBot:
             except Exception:
                 pass
 
+    async def _start_services(self):
+        """Start the application (update queue consumer) and background workers"""
+        await self.application.initialize()
+        await self.application.start()
+        self.events.start()
+        self.users.start()
+
+        # Keep the local catalog mirror in sync
+        self._catalog_task = asyncio.create_task(self.catalog.run_sync_loop(self.woo_api))
+
+    async def _stop_services(self):
+        """Stop background workers and release connections"""
+        if self._catalog_task:
+            self._catalog_task.cancel()
+        await self.broadcasts.stop()
+        if self.application.updater and self.application.updater.running:
+            await self.application.updater.stop()
+        if self.application.running:
+            await self.application.stop()
+        await self.application.shutdown()
+        await self.events.stop()
+        await self.users.stop()
+        await self.woo_api.aclose()
+        await self.ai_service.aclose()
+        await self.sessions.close()
+        self.catalog.close()
+        self.file_ids.close()
+
+    async def start_webhook(self):
+        """Start in webhook mode: updates arrive through enqueue_update()
+
+        Registering the webhook is idempotent, so every instance behind the
+        load balancer can do it on startup.
+        """
+        if not Config.TELEGRAM_WEBHOOK_SECRET:
+            raise ValueError("TELEGRAM_WEBHOOK_SECRET is required in webhook mode")
+
+        logging.info("Starting Telegram bot in webhook mode...")
+        await self._start_services()
+        if Config.TELEGRAM_WEBHOOK_URL:
+            await self.application.bot.set_webhook(
+                url=Config.TELEGRAM_WEBHOOK_URL.rstrip('/') + Config.TELEGRAM_WEBHOOK_PATH,
+                secret_token=Config.TELEGRAM_WEBHOOK_SECRET,
+                max_connections=Config.TELEGRAM_WEBHOOK_MAX_CONNECTIONS,
+                allowed_updates=Update.ALL_TYPES
+            )
+            logging.info("Telegram webhook registered")
+
+    async def stop_webhook(self):
+        """Stop webhook mode; the webhook itself stays registered for the other instances"""
+        await self._stop_services()
+
+    async def enqueue_update(self, data: dict):
+        """Put a raw webhook update on the application's update queue"""
+        update = Update.de_json(data, self.application.bot)
+        await self.application.update_queue.put(update)
+
     async def run(self):
-        """Run the bot asynchronously"""
+        """Run the bot asynchronously with long polling"""
         try:
             logging.info("Starting Telegram bot...")
-            await self.application.initialize()
-            await self.application.start()
+            await self._start_services()
             await self.application.updater.start_polling(drop_pending_updates=True)
 
             # Keep the bot running
@@ -803,7 +1094,7 @@ class TelegramBot:
             logging.error(f"Failed to start bot: {e}")
             raise
         finally:
-            await self.application.stop()
+            await self._stop_services()
 
     def start(self):
         """Start the bot (sync wrapper)"""
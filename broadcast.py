@@ -0,0 +1,169 @@
+import time
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from config import Config
+from send_queue import TelegramSendQueue, SENT, BLOCKED
+
+PENDING = 'pending'
+RUNNING = 'running'
+COMPLETED = 'completed'
+CANCELLED = 'cancelled'
+FAILED = 'failed'
+
+class BroadcastJob:
+    """One announcement to a segment of users, with progress counters"""
+
+    def __init__(self, text: str, language: str = None, active_days: int = None, parse_mode: str = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.text = text
+        self.language = language
+        self.active_days = active_days
+        self.parse_mode = parse_mode
+        self.status = PENDING
+        self.total = 0
+        self.sent = 0
+        self.blocked = 0
+        self.failed = 0
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def active_since(self) -> Optional[datetime]:
+        return datetime.utcnow() - timedelta(days=self.active_days) if self.active_days else None
+
+    @property
+    def processed(self) -> int:
+        return self.sent + self.blocked + self.failed
+
+    def progress(self) -> Dict:
+        """Counters, throughput and ETA for the dashboard"""
+        elapsed = ((self.finished_at or time.monotonic()) - self.started_at) if self.started_at else 0.0
+        rate = self.processed / elapsed if elapsed else 0.0
+        remaining = max(0, self.total - self.processed)
+        return {
+            'id': self.id,
+            'status': self.status,
+            'language': self.language,
+            'active_days': self.active_days,
+            'total': self.total,
+            'sent': self.sent,
+            'blocked': self.blocked,
+            'failed': self.failed,
+            'percent': round(self.processed / self.total * 100, 1) if self.total else 0.0,
+            'rate_per_second': round(rate, 2),
+            'eta_seconds': round(remaining / rate) if rate and self.status == RUNNING else None,
+            'elapsed_seconds': round(elapsed, 1),
+            'created_at': self.created_at.isoformat(),
+            'error': self.error
+        }
+
+class BroadcastEngine:
+    """Sends broadcasts through the rate-limited send queue
+
+    Recipients are streamed from the database in batches into a bounded queue
+    consumed by `workers` senders, so memory stays flat for any audience size
+    and throughput is set by the send queue's rate, not by per-send latency.
+    """
+
+    def __init__(self, repository, send_queue: TelegramSendQueue, workers: int = None, max_jobs: int = 50):
+        self.repository = repository
+        self.send_queue = send_queue
+        self.workers = workers or Config.BROADCAST_WORKERS
+        self.max_jobs = max_jobs
+        self.jobs: Dict[str, BroadcastJob] = {}
+
+    def start_broadcast(self, text: str, language: str = None, active_days: int = None,
+                        parse_mode: str = None) -> BroadcastJob:
+        """Create a job and run it in the background"""
+        job = BroadcastJob(text, language=language, active_days=active_days, parse_mode=parse_mode)
+        self.jobs[job.id] = job
+        self._trim_jobs()
+        job.task = asyncio.create_task(self._run(job))
+        logging.info(f"Broadcast {job.id} started (language={language}, active_days={active_days})")
+        return job
+
+    def get(self, job_id: str) -> Optional[BroadcastJob]:
+        return self.jobs.get(job_id)
+
+    def list_jobs(self) -> List[Dict]:
+        return [job.progress() for job in reversed(list(self.jobs.values()))]
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.jobs.get(job_id)
+        if not job or job.status not in (PENDING, RUNNING):
+            return False
+        job.task.cancel()
+        return True
+
+    def _trim_jobs(self):
+        # Forget the oldest finished jobs
+        finished = [job_id for job_id, job in self.jobs.items() if job.status not in (PENDING, RUNNING)]
+        for job_id in finished[:max(0, len(self.jobs) - self.max_jobs)]:
+            del self.jobs[job_id]
+
+    async def _run(self, job: BroadcastJob):
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.workers * 4)
+        workers = [asyncio.create_task(self._worker(job, queue)) for _ in range(self.workers)]
+        try:
+            active_since = job.active_since
+            job.total = await self.repository.count_users(job.language, active_since)
+            job.status = RUNNING
+            job.started_at = time.monotonic()
+
+            async for chat_ids in self.repository.iter_user_chat_ids(job.language, active_since):
+                for chat_id in chat_ids:
+                    await queue.put(chat_id)
+
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+            job.status = COMPLETED
+            logging.info(f"Broadcast {job.id} completed: {job.progress()}")
+
+        except asyncio.CancelledError:
+            job.status = CANCELLED
+            logging.info(f"Broadcast {job.id} cancelled after {job.processed} sends")
+        except Exception as e:
+            job.status = FAILED
+            job.error = str(e)
+            logging.error(f"Broadcast {job.id} failed: {e}")
+        finally:
+            for worker in workers:
+                worker.cancel()
+            job.finished_at = time.monotonic()
+
+    async def _worker(self, job: BroadcastJob, queue: asyncio.Queue):
+        while True:
+            chat_id = await queue.get()
+            if chat_id is None:
+                return
+            try:
+                result = await self.send_queue.send_message(chat_id, job.text, parse_mode=job.parse_mode)
+            except Exception as e:
+                logging.error(f"Broadcast {job.id} send to {chat_id} failed: {e}")
+                result = None
+            if result == SENT:
+                job.sent += 1
+            elif result == BLOCKED:
+                job.blocked += 1
+            else:
+                job.failed += 1
+
+    async def stop(self):
+        """Cancel running broadcasts"""
+        for job in self.jobs.values():
+            if job.task and not job.task.done():
+                job.task.cancel()
+
+    def stats(self) -> Dict:
+        return {
+            'jobs': len(self.jobs),
+            'running': sum(1 for job in self.jobs.values() if job.status == RUNNING),
+            'send_queue': self.send_queue.stats()
+        }
@@ -0,0 +1,102 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+FRESH = 'fresh'
+STALE = 'stale'
+
+class TTLCache:
+    """Bounded in-process cache with per-entry TTL, LRU eviction and a stale window
+
+    Entries past their TTL are still served as stale for `stale_ttl` seconds so
+    callers can return them immediately while a refresh runs in the background.
+    Older entries are kept until evicted and are only reachable through peek().
+    """
+
+    def __init__(self, max_size: int = 1000, default_ttl: float = 60, stale_ttl: float = 0):
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self.stale_ttl = stale_ttl
+        self._data: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Counters
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Tuple[Optional[Any], Optional[str]]:
+        """Get a value and its state (FRESH, STALE or None on a miss)"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None, None
+
+            value, expires_at = entry
+            now = time.monotonic()
+            if now < expires_at:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value, FRESH
+
+            if now < expires_at + self.stale_ttl:
+                self._data.move_to_end(key)
+                self.stale_hits += 1
+                return value, STALE
+
+            # Expired entries stay until evicted so peek() can serve them as a last resort
+            self.misses += 1
+            return None, None
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """Get a stored value regardless of age, without touching counters or LRU order"""
+        with self._lock:
+            entry = self._data.get(key)
+            return entry[0] if entry is not None else None
+
+    def set(self, key: Hashable, value: Any, ttl: float = None):
+        """Store a value, evicting the least recently used entries if full"""
+        ttl = self.default_ttl if ttl is None else ttl
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> bool:
+        """Remove one entry"""
+        with self._lock:
+            return self._data.pop(key, None) is not None
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Remove every entry whose key matches the predicate"""
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> Dict:
+        """Counters for the dashboard"""
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            'size': len(self._data),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round((self.hits + self.stale_hits) / lookups * 100, 2) if lookups else 0.0
+        }
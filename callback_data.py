@@ -0,0 +1,63 @@
+from typing import Dict, Optional
+from product_record import POPULAR, PRICE_ASC, PRICE_DESC, NEWEST
+
+# Telegram rejects callback_data longer than 64 bytes
+MAX_CALLBACK_DATA = 64
+
+# Actions
+CATEGORIES = 'l'  # category list page
+CATEGORY = 'c'    # product list page of one category
+PRODUCT = 'p'     # product details, remembering the list page to go back to
+
+_SORT_CODES = {POPULAR: 'p', PRICE_ASC: 'a', PRICE_DESC: 'd', NEWEST: 'n'}
+_SORTS = {code: sort for sort, code in _SORT_CODES.items()}
+_LANGUAGE_CODES = {'fa': 'f', 'en': 'e'}
+_LANGUAGES = {code: language for language, code in _LANGUAGE_CODES.items()}
+
+_SEP = '.'
+_DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+def _b36(number: int) -> str:
+    if number == 0:
+        return '0'
+    out = []
+    while number:
+        number, rem = divmod(number, 36)
+        out.append(_DIGITS[rem])
+    return ''.join(reversed(out))
+
+def _pack(*fields) -> str:
+    data = _SEP.join(_b36(field) if isinstance(field, int) else field for field in fields)
+    if len(data.encode()) > MAX_CALLBACK_DATA:
+        raise ValueError(f"Callback data too long: {data}")
+    return data
+
+def pack_categories(page: int, language: str) -> str:
+    """Callback data for a page of the category list"""
+    return _pack(CATEGORIES, page, _LANGUAGE_CODES.get(language, 'f'))
+
+def pack_category(category_id: int, page: int, sort: str, language: str) -> str:
+    """Callback data for a page of a category's products"""
+    return _pack(CATEGORY, category_id, page, _SORT_CODES.get(sort, 'p'), _LANGUAGE_CODES.get(language, 'f'))
+
+def pack_product(product_id: int, category_id: int, page: int, sort: str, language: str) -> str:
+    """Callback data for product details, carrying the list page to return to"""
+    return _pack(PRODUCT, product_id, category_id or 0, page, _SORT_CODES.get(sort, 'p'),
+                 _LANGUAGE_CODES.get(language, 'f'))
+
+def unpack(data: str) -> Optional[Dict]:
+    """Decode packed callback data, or None for anything else (legacy or plain strings)"""
+    fields = data.split(_SEP)
+    action = fields[0]
+    try:
+        if action == CATEGORIES and len(fields) == 3:
+            return {'action': action, 'page': int(fields[1], 36), 'language': _LANGUAGES[fields[2]]}
+        if action == CATEGORY and len(fields) == 5:
+            return {'action': action, 'category_id': int(fields[1], 36), 'page': int(fields[2], 36),
+                    'sort': _SORTS[fields[3]], 'language': _LANGUAGES[fields[4]]}
+        if action == PRODUCT and len(fields) == 6:
+            return {'action': action, 'product_id': int(fields[1], 36), 'category_id': int(fields[2], 36),
+                    'page': int(fields[3], 36), 'sort': _SORTS[fields[4]], 'language': _LANGUAGES[fields[5]]}
+    except (KeyError, ValueError):
+        return None
+    return None
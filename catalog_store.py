@@ -0,0 +1,473 @@
+import json
+import time
+import bisect
+import sqlite3
+import asyncio
+import logging
+import threading
+from typing import List, Dict, Optional, Callable, Awaitable
+from config import Config
+from woocommerce_api import WooCommerceAPIError
+from product_record import ProductRecord, CATALOG_FIELDS, POPULAR, SORT_DESCENDING
+from rate_limiter import priority, SYNC
+
+class CatalogStore:
+    """Local mirror of the WooCommerce catalog
+
+    Products and categories are persisted in an embedded SQLite file and served
+    from in-memory indexes, so browse paths never wait on the store. After the
+    initial full load, syncs only fetch products modified after the watermark.
+    Deleted and trashed products, which those syncs cannot see, are found by
+    a periodic id-only reconcile.
+    Products are held as compact ProductRecord objects.
+    """
+
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or Config.CATALOG_DB_PATH
+        self._lock = threading.Lock()
+        self._sync_lock = asyncio.Lock()
+        self._resync_task: Optional[asyncio.Task] = None
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._create_tables()
+
+        # In-memory indexes used by the bot
+        self._products: Dict[int, ProductRecord] = {}
+        self._categories: List[Dict] = []
+        self._category_products: Dict[int, List[int]] = {}
+        self._sorted: Dict[tuple, List[int]] = {}  # (category_id, sort) -> product ids, per version
+        self.version = 0  # bumped on every change, used to key rendered views
+
+        # Freshness watermark
+        self.watermark: Optional[str] = None  # max date_modified_gmt seen
+        self.last_sync_at: Optional[float] = None
+        self.last_full_sync_at: Optional[float] = None
+        self.last_reconcile_at: Optional[float] = None  # last check for deleted products
+
+        # Async callbacks run after each sync: listener(changed, removed_ids, full)
+        self._listeners: List[Callable[[List[Dict], List[int], bool], Awaitable[None]]] = []
+
+        self._load()
+        logging.info(f"Catalog store opened: {self.db_path} ({len(self._products)} products)")
+
+    def _create_tables(self):
+        """Create the catalog tables if they do not exist"""
+        with self._lock:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS products (
+                    id INTEGER PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    date_modified_gmt TEXT
+                );
+                CREATE TABLE IF NOT EXISTS categories (
+                    id INTEGER PRIMARY KEY,
+                    data TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+            """)
+            self._conn.commit()
+
+    def _load(self):
+        """Load the persisted catalog into memory"""
+        with self._lock:
+            products = {row[0]: ProductRecord.from_dict(json.loads(row[1]))
+                        for row in self._conn.execute("SELECT id, data FROM products")}
+            categories = [json.loads(row[0]) for row in self._conn.execute("SELECT data FROM categories")]
+            state = dict(self._conn.execute("SELECT key, value FROM sync_state").fetchall())
+
+        self._products = products
+        self._categories = categories
+        self._rebuild_indexes()
+
+        self.watermark = state.get('watermark')
+        self.last_sync_at = float(state['last_sync_at']) if state.get('last_sync_at') else None
+        self.last_full_sync_at = float(state['last_full_sync_at']) if state.get('last_full_sync_at') else None
+        self.last_reconcile_at = self.last_full_sync_at
+
+        # Rows saved before date_created_gmt was mirrored: reload everything on the next sync
+        if any(product.date_created_gmt is None for product in products.values()):
+            self.watermark = None
+
+    def _rebuild_indexes(self):
+        """Rebuild sorted category and category -> products indexes"""
+        self._categories.sort(key=lambda cat: cat.get('name', ''))
+
+        category_products: Dict[int, List[int]] = {}
+        for product in self._products.values():
+            for category_id, _ in product.categories:
+                category_products.setdefault(category_id, []).append(product.id)
+
+        # Same ordering as the live API: popularity desc
+        for product_ids in category_products.values():
+            product_ids.sort(key=lambda pid: self._products[pid].total_sales, reverse=True)
+
+        self._category_products = category_products
+        self._sorted = {}
+        self.version += 1
+
+    @staticmethod
+    def _categories_key(categories: List[Dict]) -> List[tuple]:
+        """Order-independent view of the category fields the bot shows"""
+        return sorted((cat.get('id'), cat.get('name'), cat.get('count'), cat.get('parent')) for cat in categories)
+
+    def _sort_key(self, product_id: int):
+        # Popularity desc, matching _rebuild_indexes
+        return -self._products[product_id].total_sales
+
+    def _unindex_product(self, product: ProductRecord) -> set:
+        """Drop a product from the category index, returning the categories touched"""
+        touched = set()
+        for category_id, _ in product.categories:
+            product_ids = self._category_products.get(category_id)
+            if product_ids and product.id in product_ids:
+                product_ids.remove(product.id)
+                touched.add(category_id)
+        return touched
+
+    def _index_product(self, product: ProductRecord) -> set:
+        """Insert a product (already in _products) into its categories' popularity order"""
+        touched = set()
+        for category_id, _ in product.categories:
+            bisect.insort(self._category_products.setdefault(category_id, []), product.id, key=self._sort_key)
+            touched.add(category_id)
+        return touched
+
+    def _changed(self, category_ids: set):
+        """Forget memoized orderings of the touched categories and the all-products list"""
+        for key in [key for key in self._sorted if key[0] is None or key[0] in category_ids]:
+            del self._sorted[key]
+        self.version += 1
+
+    # ---- Reads (in-memory) ----
+
+    @property
+    def is_loaded(self) -> bool:
+        """Whether the catalog has completed at least one full load"""
+        return self.last_full_sync_at is not None
+
+    def get_categories(self) -> List[Dict]:
+        """Get non-empty categories ordered by name"""
+        return [cat for cat in self._categories if cat.get('count', 0) > 0]
+
+    def _product_ids(self, category_id: int = None, sort: str = POPULAR) -> List[int]:
+        """Product ids in sort order, memoized until the catalog changes"""
+        key = (category_id, sort)
+        product_ids = self._sorted.get(key)
+        if product_ids is None:
+            product_ids = self._category_products.get(category_id, []) if category_id else list(self._products)
+            if sort != POPULAR or not category_id:
+                product_ids = sorted(product_ids, key=lambda pid: self._products[pid].sort_value(sort),
+                                     reverse=sort in SORT_DESCENDING)
+            self._sorted[key] = product_ids
+        return product_ids
+
+    def get_products(self, category_id: int = None, per_page: int = 20, page: int = 1,
+                     sort: str = POPULAR) -> List[ProductRecord]:
+        """Get products ordered by popularity (or `sort`), optionally filtered by category"""
+        product_ids = self._product_ids(category_id, sort)
+        start = (page - 1) * per_page
+        return [self._products[pid] for pid in product_ids[start:start + per_page]]
+
+    def count_products(self, category_id: int = None) -> int:
+        """Number of products, optionally in one category"""
+        if category_id:
+            return len(self._category_products.get(category_id, []))
+        return len(self._products)
+
+    def get_product(self, product_id: int) -> Optional[ProductRecord]:
+        """Get a product by ID"""
+        return self._products.get(product_id)
+
+    def all_products(self) -> List[ProductRecord]:
+        """Every published product, unordered"""
+        return list(self._products.values())
+
+    def status(self) -> Dict:
+        """Freshness information for the dashboard"""
+        return {
+            'products': len(self._products),
+            'categories': len(self._categories),
+            'watermark': self.watermark,
+            'last_sync_at': self.last_sync_at,
+            'last_full_sync_at': self.last_full_sync_at,
+            'last_reconcile_at': self.last_reconcile_at,
+            'age_seconds': round(time.time() - self.last_sync_at, 1) if self.last_sync_at else None,
+            'loaded': self.is_loaded,
+            'resyncing': self.resyncing
+        }
+
+    # ---- Sync ----
+
+    def add_listener(self, listener: Callable[[List[Dict], List[int], bool], Awaitable[None]]):
+        """Register a coroutine called with (changed products, removed ids, full) after each sync"""
+        self._listeners.append(listener)
+
+    async def _notify(self, changed: List[Dict], removed: List[int], full: bool):
+        for listener in self._listeners:
+            try:
+                await listener(changed, removed, full)
+            except Exception as e:
+                logging.error(f"Catalog listener error: {e}")
+
+    async def sync(self, api, force: bool = False) -> bool:
+        """Sync the catalog from WooCommerce
+
+        Args:
+            api: AsyncWooCommerceAPI instance
+            force: Discard the watermark and do a full resync
+
+        Returns:
+            True if the sync completed
+        """
+        async with self._sync_lock:
+            with priority(SYNC):
+                if force or not self.is_loaded or not self.watermark:
+                    return await self._full_sync(api)
+                return await self._incremental_sync(api)
+
+    async def force_resync(self, api) -> bool:
+        """Discard the watermark and reload the whole catalog"""
+        return await self.sync(api, force=True)
+
+    def start_resync(self, api) -> bool:
+        """Run force_resync in the background; False if one is already running"""
+        if self.resyncing:
+            return False
+        self._resync_task = asyncio.create_task(self._background_resync(api))
+        return True
+
+    async def _background_resync(self, api):
+        # Nothing awaits this task, so errors are logged here like in run_sync_loop
+        try:
+            await self.force_resync(api)
+        except Exception as e:
+            logging.error(f"Catalog resync error: {e}")
+
+    @property
+    def resyncing(self) -> bool:
+        return self._resync_task is not None and not self._resync_task.done()
+
+    async def reconcile(self, api) -> bool:
+        """Drop products that were trashed or deleted in WooCommerce
+
+        Incremental syncs only see products that still exist and are not in
+        the trash, so deletions are found by comparing ids with the store's
+        published products.
+        """
+        async with self._sync_lock:
+            with priority(SYNC):
+                known = set(self._products)
+                try:
+                    live = {product['id'] async for product in api.iter_products(per_page=Config.CATALOG_PAGE_SIZE,
+                                                                                 fields='id')}
+                except WooCommerceAPIError as e:
+                    logging.error(f"Catalog reconcile failed: {e}")
+                    return False
+
+                # Products added while the ids were fetched are not in `known`, so they stay
+                removed = [product_id for product_id in known - live if product_id in self._products]
+                self.last_reconcile_at = time.time()
+                if not removed:
+                    return True
+
+                loop = asyncio.get_event_loop()
+                await loop.run_in_executor(None, self._sync_delete_products, removed)
+                for product_id in removed:
+                    del self._products[product_id]
+                self._rebuild_indexes()
+                await self._notify([], removed, False)
+                logging.info(f"Catalog reconcile: removed {len(removed)} deleted products")
+                return True
+
+    async def _fetch_categories(self, api) -> Optional[List[Dict]]:
+        """Fetch every category"""
+        try:
+            return [category async for category in api.iter_categories(per_page=Config.CATALOG_PAGE_SIZE,
+                                                                       fields='id,name,count,parent')]
+        except WooCommerceAPIError as e:
+            logging.error(f"Catalog category fetch failed: {e}")
+            return None
+
+    async def _fetch_products(self, api, modified_after: str = None) -> Optional[List[ProductRecord]]:
+        """Fetch every product as a compact record, optionally only those modified after a timestamp"""
+        try:
+            return [ProductRecord.from_api(product)
+                    async for product in api.iter_products(modified_after=modified_after,
+                                                           per_page=Config.CATALOG_PAGE_SIZE,
+                                                           fields=CATALOG_FIELDS)]
+        except WooCommerceAPIError as e:
+            logging.error(f"Catalog product fetch failed: {e}")
+            return None
+
+    async def _full_sync(self, api) -> bool:
+        """Replace the whole catalog"""
+        started = time.time()
+        categories = await self._fetch_categories(api)
+        products = await self._fetch_products(api)
+
+        if categories is None or products is None:
+            logging.error("Full catalog sync failed, keeping current catalog")
+            return False
+
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self._sync_replace_all, categories, products)
+
+        self._categories = categories
+        self._products = {product.id: product for product in products if product.status == 'publish'}
+        self._rebuild_indexes()
+        await self._notify(self.all_products(), [], True)
+
+        logging.info(f"Full catalog sync: {len(self._products)} products, {len(categories)} categories "
+                     f"in {time.time() - started:.1f}s")
+        return True
+
+    async def _incremental_sync(self, api) -> bool:
+        """Apply products modified since the watermark"""
+        categories = await self._fetch_categories(api)
+        products = await self._fetch_products(api, modified_after=self.watermark)
+
+        if categories is None or products is None:
+            logging.error("Incremental catalog sync failed")
+            return False
+
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self._sync_apply_changes, categories, products)
+
+        categories_changed = self._categories_key(categories) != self._categories_key(self._categories)
+        self._categories = categories
+        changed, removed = [], []
+        for product in products:
+            if product.status == 'publish':
+                self._products[product.id] = product
+                changed.append(product)
+            elif self._products.pop(product.id, None) is not None:
+                removed.append(product.id)
+
+        # Nothing new: keep indexes and version so version-keyed caches stay valid
+        if changed or removed or categories_changed:
+            self._rebuild_indexes()
+        if changed or removed:
+            await self._notify(changed, removed, False)
+
+        if products:
+            logging.info(f"Incremental catalog sync: {len(products)} products changed")
+        return True
+
+    def _sync_replace_all(self, categories: List[Dict], products: List[ProductRecord]):
+        """Sync version of replacing the persisted catalog"""
+        now = time.time()
+        watermark = max((p.date_modified_gmt or '' for p in products), default='') or None
+
+        with self._lock:
+            self._conn.execute("DELETE FROM products")
+            self._conn.execute("DELETE FROM categories")
+            self._write_categories(categories)
+            self._write_products([p for p in products if p.status == 'publish'])
+            self._write_state(watermark=watermark, last_sync_at=now, last_full_sync_at=now)
+            self._conn.commit()
+
+        self.watermark = watermark
+        self.last_sync_at = now
+        self.last_full_sync_at = now
+        self.last_reconcile_at = now
+
+    def _sync_apply_changes(self, categories: List[Dict], products: List[ProductRecord]):
+        """Sync version of applying incremental changes"""
+        now = time.time()
+        watermark = max([self.watermark or ''] + [p.date_modified_gmt or '' for p in products]) or None
+
+        with self._lock:
+            self._conn.execute("DELETE FROM categories")
+            self._write_categories(categories)
+            self._write_products([p for p in products if p.status == 'publish'])
+            removed = [(p.id,) for p in products if p.status != 'publish']
+            if removed:
+                self._conn.executemany("DELETE FROM products WHERE id = ?", removed)
+            self._write_state(watermark=watermark, last_sync_at=now)
+            self._conn.commit()
+
+        self.watermark = watermark
+        self.last_sync_at = now
+
+    def _write_categories(self, categories: List[Dict]):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO categories (id, data) VALUES (?, ?)",
+            [(cat['id'], json.dumps(cat, ensure_ascii=False)) for cat in categories]
+        )
+
+    def _write_products(self, products: List[ProductRecord]):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO products (id, data, date_modified_gmt) VALUES (?, ?, ?)",
+            [(p.id, json.dumps(p.to_dict(), ensure_ascii=False), p.date_modified_gmt) for p in products]
+        )
+
+    def _write_state(self, **values):
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)",
+            [(key, None if value is None else str(value)) for key, value in values.items()]
+        )
+
+    async def upsert_product(self, product: Dict):
+        """Apply a pushed product change (e.g. from a webhook) without touching the watermark"""
+        product = ProductRecord.from_api(product)
+        if product.status != 'publish':
+            await self.remove_product(product.id)
+            return
+
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self._sync_write_product, product)
+
+        # Update only this product's categories instead of rebuilding every index
+        previous = self._products.get(product.id)
+        touched = self._unindex_product(previous) if previous else set()
+        self._products[product.id] = product
+        touched |= self._index_product(product)
+        self._changed(touched)
+        await self._notify([product], [], False)
+
+    async def remove_product(self, product_id: int):
+        """Drop a product pushed as deleted or unpublished"""
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self._sync_delete_product, product_id)
+
+        previous = self._products.get(product_id)
+        if previous is not None:
+            touched = self._unindex_product(previous)
+            del self._products[product_id]
+            self._changed(touched)
+            await self._notify([], [product_id], False)
+
+    def _sync_write_product(self, product: ProductRecord):
+        """Sync version of persisting one product"""
+        with self._lock:
+            self._write_products([product])
+            self._conn.commit()
+
+    def _sync_delete_product(self, product_id: int):
+        """Sync version of deleting one product"""
+        self._sync_delete_products([product_id])
+
+    def _sync_delete_products(self, product_ids: List[int]):
+        """Sync version of deleting products"""
+        with self._lock:
+            self._conn.executemany("DELETE FROM products WHERE id = ?", [(product_id,) for product_id in product_ids])
+            self._conn.commit()
+
+    async def run_sync_loop(self, api, interval: int = None):
+        """Keep the catalog fresh until cancelled"""
+        interval = interval or Config.CATALOG_SYNC_INTERVAL
+        while True:
+            try:
+                await self.sync(api)
+                if time.time() - (self.last_reconcile_at or 0) >= Config.CATALOG_RECONCILE_INTERVAL:
+                    await self.reconcile(api)
+            except Exception as e:
+                logging.error(f"Catalog sync error: {e}")
+            await asyncio.sleep(interval)
+
+    def close(self):
+        """Close the SQLite connection"""
+        with self._lock:
+            self._conn.close()
@@ -9,6 +9,22 @@ class Config:
     
     # Telegram Bot Configuration
     TELEGRAM_BOT_TOKEN = "7540724852:AAG-TfeGVGmssW4K3MLKkyiwwOyyqlsCGPI"
+    TELEGRAM_UPDATE_MODE = os.environ.get('TELEGRAM_UPDATE_MODE', 'polling')  # 'polling' or 'webhook'
+    TELEGRAM_WEBHOOK_URL = os.environ.get('TELEGRAM_WEBHOOK_URL')  # public base URL, e.g. 'https://bot.example.com'
+    TELEGRAM_WEBHOOK_PATH = os.environ.get('TELEGRAM_WEBHOOK_PATH', '/webhooks/telegram')
+    # Required in webhook mode; sent back in X-Telegram-Bot-Api-Secret-Token (A-Z, a-z, 0-9, _ and -)
+    TELEGRAM_WEBHOOK_SECRET = os.environ.get('TELEGRAM_WEBHOOK_SECRET')
+    TELEGRAM_WEBHOOK_MAX_CONNECTIONS = int(os.environ.get('TELEGRAM_WEBHOOK_MAX_CONNECTIONS', '40'))
+    TELEGRAM_CONCURRENT_UPDATES = int(os.environ.get('TELEGRAM_CONCURRENT_UPDATES', '64'))  # handlers running at once
+    
+    # Token required in the X-Admin-Token header by admin API endpoints (disabled when unset)
+    ADMIN_API_TOKEN = os.environ.get('ADMIN_API_TOKEN')
+    
+    # Outbound send queue and broadcasts (Telegram allows ~30 msg/s overall, 1 msg/s per chat)
+    TELEGRAM_SEND_RATE = float(os.environ.get('TELEGRAM_SEND_RATE', '25'))  # headroom left for handler replies
+    TELEGRAM_PER_CHAT_INTERVAL = float(os.environ.get('TELEGRAM_PER_CHAT_INTERVAL', '1.0'))  # seconds
+    TELEGRAM_SEND_RETRIES = int(os.environ.get('TELEGRAM_SEND_RETRIES', '3'))
+    BROADCAST_WORKERS = int(os.environ.get('BROADCAST_WORKERS', '30'))
     # OpenAI Configuration
     OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
     
@@ -16,6 +32,87 @@ class Config:
     WOOCOMMERCE_URL = os.environ.get('WOOCOMMERCE_URL')  # e.g., 'https://yourstore.com'
     WOOCOMMERCE_CONSUMER_KEY = os.environ.get('WOOCOMMERCE_CONSUMER_KEY')
     WOOCOMMERCE_CONSUMER_SECRET = os.environ.get('WOOCOMMERCE_CONSUMER_SECRET')
+    WOOCOMMERCE_WEBHOOK_SECRET = os.environ.get('WOOCOMMERCE_WEBHOOK_SECRET')
+    
+    # WooCommerce HTTP client (shared keep-alive pool used by the bot)
+    WOOCOMMERCE_TIMEOUT = float(os.environ.get('WOOCOMMERCE_TIMEOUT', '30'))
+    WOOCOMMERCE_CONNECT_TIMEOUT = float(os.environ.get('WOOCOMMERCE_CONNECT_TIMEOUT', '5'))
+    WOOCOMMERCE_MAX_CONNECTIONS = int(os.environ.get('WOOCOMMERCE_MAX_CONNECTIONS', '20'))
+    WOOCOMMERCE_MAX_KEEPALIVE = int(os.environ.get('WOOCOMMERCE_MAX_KEEPALIVE', '10'))
+    WOOCOMMERCE_KEEPALIVE_EXPIRY = float(os.environ.get('WOOCOMMERCE_KEEPALIVE_EXPIRY', '30'))
+    WOOCOMMERCE_HTTP2 = os.environ.get('WOOCOMMERCE_HTTP2', 'True').lower() == 'true'
+    WOOCOMMERCE_PAGE_CONCURRENCY = int(os.environ.get('WOOCOMMERCE_PAGE_CONCURRENCY', '4'))
+    
+    # WooCommerce failure handling
+    WOOCOMMERCE_MIN_TIMEOUT = float(os.environ.get('WOOCOMMERCE_MIN_TIMEOUT', '2'))  # adaptive timeout floor
+    WOOCOMMERCE_MAX_RETRIES = int(os.environ.get('WOOCOMMERCE_MAX_RETRIES', '2'))
+    WOOCOMMERCE_RETRY_BACKOFF = float(os.environ.get('WOOCOMMERCE_RETRY_BACKOFF', '0.2'))  # seconds
+    WOOCOMMERCE_RETRY_RATIO = float(os.environ.get('WOOCOMMERCE_RETRY_RATIO', '0.2'))  # retries per request
+    WOOCOMMERCE_BREAKER_THRESHOLD = int(os.environ.get('WOOCOMMERCE_BREAKER_THRESHOLD', '5'))
+    WOOCOMMERCE_BREAKER_RESET = float(os.environ.get('WOOCOMMERCE_BREAKER_RESET', '30'))  # seconds
+    
+    # WooCommerce outbound rate limit (requests/second, shared by all priority classes)
+    WOOCOMMERCE_RATE_LIMIT = float(os.environ.get('WOOCOMMERCE_RATE_LIMIT', '10'))
+    WOOCOMMERCE_RATE_BURST = int(os.environ.get('WOOCOMMERCE_RATE_BURST', '20'))
+    WOOCOMMERCE_RATE_RESERVE = int(os.environ.get('WOOCOMMERCE_RATE_RESERVE', '2'))  # tokens kept for interactive calls
+    
+    # Local catalog mirror
+    CATALOG_DB_PATH = os.environ.get('CATALOG_DB_PATH', 'catalog.db')
+    CATALOG_SYNC_INTERVAL = int(os.environ.get('CATALOG_SYNC_INTERVAL', '300'))  # seconds
+    CATALOG_RECONCILE_INTERVAL = int(os.environ.get('CATALOG_RECONCILE_INTERVAL', '3600'))  # seconds, id-only check for deletions
+    CATALOG_PAGE_SIZE = int(os.environ.get('CATALOG_PAGE_SIZE', '100'))
+    
+    # WooCommerce response cache (seconds)
+    CACHE_MAX_SIZE = int(os.environ.get('CACHE_MAX_SIZE', '2000'))
+    CACHE_STALE_TTL = int(os.environ.get('CACHE_STALE_TTL', '600'))
+    CACHE_TTLS = {
+        'categories': int(os.environ.get('CACHE_TTL_CATEGORIES', '600')),
+        'products': int(os.environ.get('CACHE_TTL_PRODUCTS', '120')),
+        'product': int(os.environ.get('CACHE_TTL_PRODUCT', '300')),
+    }
+    
+    # Write-behind event logging
+    EVENT_FLUSH_INTERVAL_MS = int(os.environ.get('EVENT_FLUSH_INTERVAL_MS', '500'))
+    EVENT_FLUSH_MAX_ROWS = int(os.environ.get('EVENT_FLUSH_MAX_ROWS', '500'))
+    EVENT_BUFFER_LIMIT = int(os.environ.get('EVENT_BUFFER_LIMIT', '50000'))
+    EVENT_FLUSH_RETRIES = int(os.environ.get('EVENT_FLUSH_RETRIES', '3'))
+    
+    # User identity cache
+    USER_CACHE_MAX_SIZE = int(os.environ.get('USER_CACHE_MAX_SIZE', '10000'))
+    USER_TOUCH_FLUSH_INTERVAL = float(os.environ.get('USER_TOUCH_FLUSH_INTERVAL', '30'))  # seconds
+    
+    # Session store for conversational state ('memory', 'sqlite' or 'redis')
+    SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'memory')
+    SESSION_TTL = float(os.environ.get('SESSION_TTL', '900'))  # seconds
+    SESSION_MAX_SIZE = int(os.environ.get('SESSION_MAX_SIZE', '10000'))  # memory backend only
+    SESSION_DB_PATH = os.environ.get('SESSION_DB_PATH', 'sessions.db')
+    REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+    
+    # Conversation cache
+    CONVERSATION_CACHE_MAX_SIZE = int(os.environ.get('CONVERSATION_CACHE_MAX_SIZE', '10000'))
+    CONVERSATION_CONTEXT_SIZE = int(os.environ.get('CONVERSATION_CONTEXT_SIZE', '10'))  # messages kept for the AI
+    
+    # Catalog browsing
+    CATEGORIES_PAGE_SIZE = int(os.environ.get('CATEGORIES_PAGE_SIZE', '15'))
+    PRODUCTS_PAGE_SIZE = int(os.environ.get('PRODUCTS_PAGE_SIZE', '10'))
+    
+    # Product photos (sent by URL once, then by cached Telegram file_id)
+    PRODUCT_PHOTOS = os.environ.get('PRODUCT_PHOTOS', 'True').lower() == 'true'
+    FILE_ID_DB_PATH = os.environ.get('FILE_ID_DB_PATH', 'file_ids.db')
+    
+    # Inline mode search
+    INLINE_RESULTS_PAGE_SIZE = int(os.environ.get('INLINE_RESULTS_PAGE_SIZE', '20'))  # Telegram allows up to 50
+    INLINE_CACHE_TIME = int(os.environ.get('INLINE_CACHE_TIME', '300'))  # seconds, also sent as cache_time
+    INLINE_CACHE_MAX_SIZE = int(os.environ.get('INLINE_CACHE_MAX_SIZE', '2000'))
+    
+    # Rendered message/keyboard cache
+    RENDER_CACHE_MAX_SIZE = int(os.environ.get('RENDER_CACHE_MAX_SIZE', '5000'))
+    RENDER_CACHE_TTL = int(os.environ.get('RENDER_CACHE_TTL', '3600'))  # seconds
+    
+    # Order lookup cache (seconds)
+    ORDER_CACHE_TTL = int(os.environ.get('ORDER_CACHE_TTL', '60'))
+    ORDER_ID_CACHE_TTL = int(os.environ.get('ORDER_ID_CACHE_TTL', '86400'))
+    ORDER_CACHE_MAX_SIZE = int(os.environ.get('ORDER_CACHE_MAX_SIZE', '5000'))
     
     # Database Configuration
     DATABASE_URL = os.environ.get('DATABASE_URL', 'sqlite:///telegram_bot.db')
@@ -32,6 +129,8 @@ class Config:
     AI_MODEL = "gpt-4o"  # the newest OpenAI model is "gpt-4o" which was released May 13, 2024
     AI_MAX_TOKENS = 1000
     AI_TEMPERATURE = 0.7
+    AI_STREAMING = os.environ.get('AI_STREAMING', 'True').lower() == 'true'
+    AI_STREAM_EDIT_INTERVAL = float(os.environ.get('AI_STREAM_EDIT_INTERVAL', '1.0'))  # seconds between message edits
     
     # Local AI Configuration
     USE_LOCAL_AI = os.environ.get('USE_LOCAL_AI', 'False').lower() == 'true'
@@ -81,6 +180,10 @@ MESSAGES = {
         'processing': '⏳ در حال پردازش...',
         'no_products': 'هیچ محصولی در این دسته‌بندی یافت نشد.',
         'view_product': '👁️ مشاهده محصول',
+        'sort_popular': 'پرفروش',
+        'sort_price_asc': 'ارزان‌ترین',
+        'sort_price_desc': 'گران‌ترین',
+        'sort_newest': 'جدیدترین',
         'price': 'قیمت:',
         'in_stock': 'موجود',
         'out_of_stock': 'ناموجود',
@@ -104,6 +207,10 @@ MESSAGES = {
         'processing': '⏳ Processing...',
         'no_products': 'No products found in this category.',
         'view_product': '👁️ View Product',
+        'sort_popular': 'Popular',
+        'sort_price_asc': 'Cheapest',
+        'sort_price_desc': 'Priciest',
+        'sort_newest': 'Newest',
         'price': 'Price:',
         'in_stock': 'In Stock',
         'out_of_stock': 'Out of Stock',
@@ -0,0 +1,88 @@
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+from config import Config
+
+class ConversationCache:
+    """In-memory active conversation per user and recent-message ring per conversation
+
+    The ring buffer is updated whenever a message is saved, so the AI path can
+    build its context without reading the database. A conversation's ring is
+    only trusted once it has been loaded from the database or was created
+    empty by this process.
+    """
+
+    def __init__(self, max_users: int = None, context_size: int = None):
+        self.max_users = max_users or Config.CONVERSATION_CACHE_MAX_SIZE
+        self.context_size = context_size or Config.CONVERSATION_CONTEXT_SIZE
+        self._active: "OrderedDict[int, int]" = OrderedDict()  # user_id -> conversation_id
+        self._messages: "OrderedDict[int, deque]" = OrderedDict()  # conversation_id -> recent messages
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+
+    # ---- Active conversation ----
+
+    def get_active(self, user_id: int) -> Optional[int]:
+        conversation_id = self._active.get(user_id)
+        if conversation_id is None:
+            self.misses += 1
+            return None
+        self._active.move_to_end(user_id)
+        self.hits += 1
+        return conversation_id
+
+    def set_active(self, user_id: int, conversation_id: int, created: bool = False):
+        """Remember a user's active conversation; a new one starts with an empty context"""
+        self._active[user_id] = conversation_id
+        self._active.move_to_end(user_id)
+        if created:
+            self._messages[conversation_id] = deque(maxlen=self.context_size)
+        self._trim()
+
+    def end_conversation(self, user_id: int):
+        """Forget the active conversation after it is escalated or resolved"""
+        conversation_id = self._active.pop(user_id, None)
+        if conversation_id is not None:
+            self._messages.pop(conversation_id, None)
+
+    # ---- Context ring ----
+
+    def get_context(self, conversation_id: int) -> Optional[List[Dict]]:
+        """Recent messages oldest first, or None if this conversation is not loaded"""
+        messages = self._messages.get(conversation_id)
+        if messages is None:
+            self.misses += 1
+            return None
+        self._messages.move_to_end(conversation_id)
+        self.hits += 1
+        return list(messages)
+
+    def has_context(self, conversation_id: int) -> bool:
+        """Whether the conversation's ring is loaded"""
+        return conversation_id in self._messages
+
+    def load_context(self, conversation_id: int, messages: List[Dict]):
+        """Seed a conversation's ring from the database"""
+        self._messages[conversation_id] = deque(messages, maxlen=self.context_size)
+        self._trim()
+
+    def append_message(self, conversation_id: int, message: Dict):
+        """Add a saved message to the ring if the conversation is loaded"""
+        messages = self._messages.get(conversation_id)
+        if messages is not None:
+            messages.append(message)
+
+    def _trim(self):
+        while len(self._active) > self.max_users:
+            self._active.popitem(last=False)
+        while len(self._messages) > self.max_users:
+            self._messages.popitem(last=False)
+
+    def stats(self) -> Dict:
+        return {
+            'active_users': len(self._active),
+            'contexts': len(self._messages),
+            'hits': self.hits,
+            'misses': self.misses
+        }
@@ -0,0 +1,209 @@
+import time
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, List
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from models import Message, UserInteraction, ProductView, OrderTracking
+from config import Config
+
+def _is_connection_error(error: Exception) -> bool:
+    """True for failures of the database itself rather than of the rows sent"""
+    if isinstance(error, (OperationalError, InterfaceError)):
+        return True
+    if isinstance(error, DBAPIError) and error.connection_invalidated:
+        return True
+    return isinstance(error, (ConnectionError, TimeoutError, asyncio.TimeoutError))
+
+class EventSink:
+    """Write-behind buffer for append-only bot events
+
+    Interaction, product view, order tracking and message rows are queued in
+    memory and written as bulk inserts every `flush_interval` seconds or once
+    `max_batch` rows are waiting. Handlers never wait on the database for these
+    writes. stop() drains whatever is still buffered.
+
+    A batch that fails to insert is put back and retried with exponential
+    backoff. While the database is unreachable rows keep waiting (up to
+    `max_buffered`); any other error is retried `max_retries` times before the
+    rows are inserted one by one, so only the rows the database rejects are
+    dropped.
+    """
+
+    MODELS = (Message, UserInteraction, ProductView, OrderTracking)
+    MAX_BACKOFF = 30.0  # seconds between retries of a failing table
+
+    def __init__(self, repository, flush_interval: float = None, max_batch: int = None, max_buffered: int = None,
+                 max_retries: int = None):
+        self.repository = repository
+        self.flush_interval = flush_interval if flush_interval is not None else Config.EVENT_FLUSH_INTERVAL_MS / 1000
+        self.max_batch = max_batch or Config.EVENT_FLUSH_MAX_ROWS
+        self.max_buffered = max_buffered or Config.EVENT_BUFFER_LIMIT
+        self.max_retries = Config.EVENT_FLUSH_RETRIES if max_retries is None else max_retries
+        self._failures: Dict[type, int] = {model: 0 for model in self.MODELS}  # consecutive failed flushes
+        self._retry_at: Dict[type, float] = {model: 0.0 for model in self.MODELS}  # backoff deadline per table
+        self._buffers: Dict[type, List[Dict]] = {model: [] for model in self.MODELS}
+        self._pending = 0
+        self._fresh = 0  # rows recorded since the last flush; requeued rows don't count
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._flush_lock = asyncio.Lock()
+
+        # Counters
+        self.written = 0
+        self.flushes = 0
+        self.dropped = 0
+        self.retried = 0
+
+    # ---- Recording (non-blocking) ----
+
+    def _add(self, model: type, row: Dict):
+        if self._pending >= self.max_buffered:
+            self.dropped += 1
+            return
+        row.setdefault('timestamp', datetime.utcnow())
+        self._buffers[model].append(row)
+        self._pending += 1
+        self._fresh += 1
+        if self._fresh >= self.max_batch:
+            self._wakeup.set()
+
+    def record_message(self, conversation_id: int, content: str, is_from_user: bool = True,
+                       telegram_message_id: int = None, is_ai_response: bool = False,
+                       ai_confidence: float = None):
+        self._add(Message, {
+            'conversation_id': conversation_id,
+            'content': content,
+            'is_from_user': is_from_user,
+            'telegram_message_id': telegram_message_id,
+            'is_ai_response': is_ai_response,
+            'ai_confidence': ai_confidence
+        })
+
+    def record_interaction(self, user_id: int, interaction_type: str, data: dict = None):
+        self._add(UserInteraction, {
+            'user_id': user_id,
+            'interaction_type': interaction_type,
+            'data': data or {}
+        })
+
+    def record_product_view(self, user_id: int, product: dict):
+        categories = product.get('categories') or []
+        self._add(ProductView, {
+            'user_id': user_id,
+            'product_id': product['id'],
+            'product_name': product['name'],
+            'category_id': categories[0].get('id') if categories else None,
+            'category_name': categories[0].get('name') if categories else None
+        })
+
+    def record_order_tracking(self, user_id: int, order_number: str, woocommerce_order_id: int = None):
+        self._add(OrderTracking, {
+            'user_id': user_id,
+            'order_number': order_number,
+            'woocommerce_order_id': woocommerce_order_id
+        })
+
+    # ---- Flushing ----
+
+    async def flush(self, force: bool = False):
+        """Write buffered rows as one bulk insert per table
+
+        Tables backing off after a failure are skipped unless `force` is set.
+        """
+        async with self._flush_lock:
+            if not self._pending:
+                return
+
+            buffers = self._buffers
+            self._buffers = {model: [] for model in self.MODELS}
+            self._pending = 0
+            self._fresh = 0
+            self._wakeup.clear()
+            now = time.monotonic()
+
+            for model, rows in buffers.items():
+                if not rows:
+                    continue
+                if not force and self._retry_at[model] > now:
+                    self._requeue(model, rows)
+                    continue
+                try:
+                    await self.repository.bulk_insert(model, rows)
+                    self.written += len(rows)
+                    self._failures[model] = 0
+                    self._retry_at[model] = 0.0
+                except Exception as e:
+                    self._failures[model] += 1
+                    if _is_connection_error(e) or self._failures[model] <= self.max_retries:
+                        delay = self._backoff(model)
+                        logging.error(f"Failed to write {len(rows)} {model.__name__} rows, retrying in {delay:.1f}s: {e}")
+                        self._requeue(model, rows)
+                        self.retried += len(rows)
+                    else:
+                        logging.error(f"Failed to write {len(rows)} {model.__name__} rows, inserting one by one: {e}")
+                        self._failures[model] = 0
+                        await self._insert_rows(model, rows)
+
+            self.flushes += 1
+
+    def _backoff(self, model: type) -> float:
+        """Push back the next attempt for a failing table, doubling each time"""
+        delay = min(self.flush_interval * 2 ** self._failures[model], self.MAX_BACKOFF)
+        self._retry_at[model] = time.monotonic() + delay
+        return delay
+
+    def _requeue(self, model: type, rows: List[Dict]):
+        # Rows go back ahead of anything recorded since, keeping insert order,
+        # and without counting towards the size-triggered flush
+        self._buffers[model][:0] = rows
+        self._pending += len(rows)
+
+    async def _insert_rows(self, model: type, rows: List[Dict]):
+        """Last resort for a failing batch: drop only the rows the database rejects"""
+        for index, row in enumerate(rows):
+            try:
+                await self.repository.bulk_insert(model, [row])
+                self.written += 1
+            except Exception as e:
+                if _is_connection_error(e):
+                    # The database went away; keep the rest for a later flush
+                    self._failures[model] += 1
+                    self._backoff(model)
+                    self._requeue(model, rows[index:])
+                    return
+                self.dropped += 1
+                logging.error(f"Dropped {model.__name__} row: {e}")
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    def start(self):
+        """Start the background flusher"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flusher and drain the buffer"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush(force=True)
+
+    def stats(self) -> Dict:
+        return {
+            'buffered': self._pending,
+            'written': self.written,
+            'flushes': self.flushes,
+            'retried': self.retried,
+            'dropped': self.dropped
+        }
@@ -0,0 +1,85 @@
+import sqlite3
+import asyncio
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+from config import Config
+
+class FileIdStore:
+    """Persistent map of image URL -> Telegram file_id
+
+    Once Telegram has fetched an image by URL, the file_id of the uploaded
+    photo is kept (in memory and in an SQLite file) and reused for every later
+    send. Each URL keeps one entry tagged with a version (the product's
+    date_modified), so an edited product re-uploads its image once.
+    """
+
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or Config.FILE_ID_DB_PATH
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS file_ids (
+                    url TEXT PRIMARY KEY,
+                    version TEXT,
+                    file_id TEXT NOT NULL
+                )
+            """)
+            self._conn.commit()
+            self._ids: Dict[str, Tuple[str, str]] = {
+                url: (version or '', file_id)
+                for url, version, file_id in self._conn.execute("SELECT url, version, file_id FROM file_ids")
+            }
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        logging.info(f"File id store opened: {self.db_path} ({len(self._ids)} images)")
+
+    def get(self, url: str, version: str = '') -> Optional[str]:
+        """file_id for this URL and version, if uploaded before"""
+        entry = self._ids.get(url)
+        if entry and entry[0] == (version or ''):
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    async def set(self, url: str, version: str, file_id: str):
+        """Remember the file_id Telegram assigned to an image"""
+        self._ids[url] = (version or '', file_id)
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self._sync_set, url, version or '', file_id)
+
+    async def invalidate(self, url: str):
+        """Forget an image whose file_id Telegram no longer accepts"""
+        if self._ids.pop(url, None) is not None:
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, self._sync_delete, url)
+
+    def _sync_set(self, url: str, version: str, file_id: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO file_ids (url, version, file_id) VALUES (?, ?, ?)",
+                (url, version, file_id)
+            )
+            self._conn.commit()
+
+    def _sync_delete(self, url: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM file_ids WHERE url = ?", (url,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'images': len(self._ids),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups * 100, 2) if lookups else 0.0
+        }
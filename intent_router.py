@@ -0,0 +1,129 @@
+import re
+from typing import Dict, Iterable, Optional
+from config import MESSAGES
+from persian_text import normalize
+
+# Intent names shared with AIService.analyze_intent
+ORDER_TRACKING = 'order_tracking'
+SUPPORT_REQUEST = 'support_request'
+CATEGORY_BROWSE = 'category_browse'
+PRODUCT_INQUIRY = 'product_inquiry'
+
+# Keywords per intent, written naturally; they are normalized when the router is built
+KEYWORDS = {
+    ORDER_TRACKING: [
+        'پیگیری سفارش', 'وضعیت سفارش', 'سفارشم', 'سفارش من', 'کد رهگیری', 'کد پیگیری',
+        'شماره سفارش', 'سفارش‌ها', 'سفارشها', 'ارسال شد', 'کی میرسه', 'کی می‌رسه', 'مرسوله',
+        'order status', 'track order', 'tracking', 'my order', 'order number', 'where is my order',
+    ],
+    SUPPORT_REQUEST: [
+        'پشتیبانی', 'پشتیبان', 'اپراتور', 'انسان', 'پاسخگو', 'کارشناس', 'تماس با شما', 'شکایت',
+        'support', 'operator', 'human', 'agent', 'complaint',
+    ],
+    CATEGORY_BROWSE: [
+        'دسته بندی', 'دسته‌بندی', 'دسته ها', 'دسته‌ها', 'منو', 'محصولات', 'فهرست محصولات', 'چی دارید',
+        'categories', 'category', 'catalog', 'menu', 'products',
+    ],
+    PRODUCT_INQUIRY: [
+        'قیمت', 'موجود', 'موجودی', 'خرید', 'میخوام', 'می‌خوام', 'دارید', 'چنده', 'سایز', 'رنگ', 'مدل',
+        'price', 'buy', 'in stock', 'available', 'cost', 'size', 'color',
+    ],
+}
+
+# Keyboard buttons map straight to an intent
+BUTTON_INTENTS = {
+    'categories': CATEGORY_BROWSE,
+    'products': CATEGORY_BROWSE,
+    'order_tracking': ORDER_TRACKING,
+    'support': SUPPORT_REQUEST,
+}
+
+# Persian suffixes a keyword may carry when written without ZWNJ (سفارشهام, دسته‌بندیها)
+_SUFFIXES = r'(?:هایم|هام|های|ها|ام|م|ی)?'
+
+# Order numbers: optional '#', 3-10 digits (Persian digits are ASCII after normalize)
+_ORDER_NUMBER_RE = re.compile(r'#?\b(\d{3,10})\b')
+_ONLY_ORDER_NUMBER_RE = re.compile(r'^#?\s*\d{3,10}$')
+
+class IntentRouter:
+    """Keyword intent router, built once at startup
+
+    All keywords are compiled into a single alternation with one named group
+    per intent, so a message is scanned once. Keywords also match with a
+    plural or possessive suffix attached. Only messages matching keywords of
+    several intents are reported as ambiguous and left for the model.
+    """
+
+    def __init__(self, keywords: Dict[str, Iterable[str]] = None):
+        keywords = keywords or KEYWORDS
+        groups = []
+        self._groups: Dict[str, str] = {}
+        for index, (intent, words) in enumerate(keywords.items()):
+            # Longest first so the alternation prefers multi-word phrases
+            alternatives = sorted({normalize(word) for word in words}, key=len, reverse=True)
+            group = f"i{index}"
+            self._groups[group] = intent
+            groups.append(f"(?P<{group}>{'|'.join(re.escape(word) for word in alternatives)})")
+        self._pattern = re.compile(r'(?<!\w)(?:' + '|'.join(groups) + r')' + _SUFFIXES + r'(?!\w)')
+
+        self._buttons = {
+            normalize(texts[key]): intent
+            for texts in MESSAGES.values()
+            for key, intent in BUTTON_INTENTS.items()
+            if key in texts
+        }
+
+    @staticmethod
+    def extract_order_number(text: str) -> Optional[str]:
+        """First order-number-like token in the text (Persian digits included)"""
+        match = _ORDER_NUMBER_RE.search(normalize(text))
+        return match.group(1) if match else None
+
+    def route(self, text: str) -> Optional[Dict]:
+        """Classify a message
+
+        Returns:
+            Intent dict shaped like AIService.analyze_intent, or None when the
+            message is ambiguous and should be classified by the model
+        """
+        normalized = normalize(text)
+        order_number = self.extract_order_number(normalized)
+        entities = {'order_number': order_number} if order_number else {}
+
+        button_intent = self._buttons.get(normalized)
+        if button_intent:
+            return self._result(button_intent, 1.0, entities)
+
+        if _ONLY_ORDER_NUMBER_RE.match(normalized):
+            return self._result(ORDER_TRACKING, 0.9, entities)
+
+        matched = {self._groups[match.lastgroup] for match in self._pattern.finditer(normalized)}
+
+        # Browsing words alongside product words mean a search; otherwise
+        # product words ("price", "I want") are too common to outweigh another intent
+        if matched == {CATEGORY_BROWSE, PRODUCT_INQUIRY}:
+            matched = {PRODUCT_INQUIRY}
+        elif len(matched) > 1:
+            matched.discard(PRODUCT_INQUIRY)
+
+        # An order number settles order tracking vs. anything else it mentions
+        if ORDER_TRACKING in matched and (len(matched) == 1 or order_number):
+            return self._result(ORDER_TRACKING, 0.9, entities)
+
+        if len(matched) == 1:
+            return self._result(matched.pop(), 0.8, entities)
+
+        if not matched:
+            # No keywords: treat as a product search, which falls back to an AI answer
+            return self._result(PRODUCT_INQUIRY, 0.5, entities)
+
+        return None
+
+    @staticmethod
+    def _result(intent: str, confidence: float, entities: Dict) -> Dict:
+        return {
+            'intent': intent,
+            'confidence': confidence,
+            'entities': entities,
+            'suggested_action': 'respond_normally'
+        }
@@ -0,0 +1,63 @@
+import re
+from typing import List
+
+# Arabic letter forms -> Persian forms
+_CHAR_MAP = {
+    'ي': 'ی',  # ي -> ی
+    'ى': 'ی',  # ى -> ی
+    'ك': 'ک',  # ك -> ک
+    'ة': 'ه',  # ة -> ه
+    'أ': 'ا',  # أ -> ا
+    'إ': 'ا',  # إ -> ا
+    'آ': 'ا',  # آ -> ا
+    'ٱ': 'ا',  # ٱ -> ا
+    'ؤ': 'و',  # ؤ -> و
+}
+
+# Persian and Arabic-Indic digits -> ASCII
+for _i in range(10):
+    _CHAR_MAP[chr(0x06F0 + _i)] = str(_i)
+    _CHAR_MAP[chr(0x0660 + _i)] = str(_i)
+
+# ZWNJ separates a word from its suffix (کتاب‌ها), so it becomes a space
+_CHAR_MAP['\u200c'] = ' '
+
+# Removed entirely: ZWJ, bidi marks, tatweel and diacritics
+for _code in (0x200D, 0x200E, 0x200F, 0x0640, 0x0670):
+    _CHAR_MAP[chr(_code)] = None
+for _code in range(0x064B, 0x0660):
+    _CHAR_MAP[chr(_code)] = None
+
+_TRANSLATION = str.maketrans(_CHAR_MAP)
+_TOKEN_RE = re.compile(r'\w+')
+_HTML_TAG_RE = re.compile('<.*?>')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+STOPWORDS = frozenset([
+    'و', 'در', 'به', 'از', 'که', 'را', 'با', 'این', 'ان', 'برای', 'یا', 'هم', 'می', 'تا',
+    # Suffixes split off by ZWNJ (گوشی‌ها -> گوشی ها)
+    'ها', 'های', 'هایی', 'ای', 'تر', 'ترین',
+    'the', 'a', 'an', 'and', 'or', 'of', 'for', 'to', 'in', 'on', 'with', 'is',
+])
+
+def normalize(text: str) -> str:
+    """Normalize Persian/English text for matching
+
+    Unifies Arabic ي/ك with Persian ی/ک, turns ZWNJ into a space, strips
+    diacritics and tatweel, maps Persian/Arabic digits to ASCII and lowercases.
+    """
+    if not text:
+        return ''
+    text = text.translate(_TRANSLATION).casefold()
+    return _WHITESPACE_RE.sub(' ', text).strip()
+
+def strip_html(text: str) -> str:
+    """Remove HTML tags"""
+    return _HTML_TAG_RE.sub('', text or '').strip()
+
+def tokenize(text: str, drop_stopwords: bool = True) -> List[str]:
+    """Normalize and split text into tokens"""
+    tokens = _TOKEN_RE.findall(normalize(text))
+    if drop_stopwords:
+        tokens = [token for token in tokens if token not in STOPWORDS]
+    return tokens
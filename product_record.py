@@ -0,0 +1,118 @@
+import sys
+from typing import Any, Dict, Optional, Tuple
+from persian_text import strip_html
+
+# Fields requested from WooCommerce for listings and for the catalog mirror
+LISTING_FIELDS = 'id,name,price,stock_status'
+CATALOG_FIELDS = ('id,name,status,price,stock_status,short_description,permalink,categories,'
+                  'total_sales,date_created_gmt,date_modified,date_modified_gmt,images')
+
+# Sort orders for product lists
+POPULAR = 'popular'
+PRICE_ASC = 'price_asc'
+PRICE_DESC = 'price_desc'
+NEWEST = 'newest'
+
+SORT_DESCENDING = frozenset([POPULAR, PRICE_DESC, NEWEST])
+
+# WooCommerce orderby/order for each sort
+API_SORTS = {
+    POPULAR: ('popularity', 'desc'),
+    PRICE_ASC: ('price', 'asc'),
+    PRICE_DESC: ('price', 'desc'),
+    NEWEST: ('date', 'desc'),
+}
+
+class ProductRecord:
+    """Compact in-memory product
+
+    Keeps only the fields the bot uses, in __slots__ instead of a per-product
+    dict, with HTML already stripped from the description and category names
+    interned. Supports `record['name']` and `record.get('name')` so code written
+    against WooCommerce product dicts keeps working.
+    """
+
+    __slots__ = ('id', 'name', 'status', 'price', 'stock_status', 'short_description', 'permalink',
+                 'categories', 'total_sales', 'date_created_gmt', 'date_modified', 'date_modified_gmt', 'image')
+
+    def __init__(self, id: int, name: str = '', status: str = 'publish', price: str = '0',
+                 stock_status: str = 'outofstock', short_description: str = '', permalink: str = '',
+                 categories: Tuple[Tuple[int, str], ...] = (), total_sales: int = 0,
+                 date_created_gmt: Optional[str] = None, date_modified: Optional[str] = None, date_modified_gmt: Optional[str] = None,
+                 image: Optional[str] = None):
+        self.id = id
+        self.name = name
+        self.status = status
+        self.price = price
+        self.stock_status = stock_status
+        self.short_description = short_description
+        self.permalink = permalink
+        self.categories = categories
+        self.total_sales = total_sales
+        self.date_created_gmt = date_created_gmt
+        self.date_modified = date_modified
+        self.date_modified_gmt = date_modified_gmt
+        self.image = image
+
+    @classmethod
+    def from_api(cls, product: Dict) -> 'ProductRecord':
+        """Build a record from WooCommerce product JSON (full or projected)"""
+        images = product.get('images') or []
+        return cls(
+            id=product['id'],
+            name=product.get('name', ''),
+            status=sys.intern(product.get('status', 'publish')),
+            price=product.get('price', '0'),
+            stock_status=sys.intern(product.get('stock_status', 'outofstock')),
+            short_description=strip_html(product.get('short_description', '')),
+            permalink=product.get('permalink', ''),
+            categories=tuple((cat.get('id'), sys.intern(cat.get('name', ''))) for cat in product.get('categories', [])),
+            total_sales=int(product.get('total_sales') or 0),
+            date_created_gmt=product.get('date_created_gmt'),
+            date_modified=product.get('date_modified'),
+            date_modified_gmt=product.get('date_modified_gmt'),
+            image=images[0].get('src') if images else product.get('image')
+        )
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ProductRecord':
+        """Build a record from to_dict() output"""
+        data = dict(data)
+        data['categories'] = tuple((cat_id, sys.intern(name)) for cat_id, name in data.get('categories', []))
+        return cls(**data)
+
+    def sort_value(self, sort: str):
+        """Value a sort order compares (see SORT_DESCENDING for direction)"""
+        if sort in (PRICE_ASC, PRICE_DESC):
+            try:
+                return float(self.price or 0)
+            except ValueError:
+                return 0.0
+        if sort == NEWEST:
+            # Creation date, like the API's orderby=date
+            return self.date_created_gmt or ''
+        return self.total_sales
+
+    def to_dict(self) -> Dict:
+        """Compact serializable form used for persistence"""
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    # Dict-style access for code written against WooCommerce JSON
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key == 'categories':
+            return [{'id': cat_id, 'name': name} for cat_id, name in self.categories]
+        if key == 'images':
+            return [{'src': self.image}] if self.image else []
+        if key in self.__slots__:
+            value = getattr(self, key)
+            return default if value is None else value
+        return default
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.__slots__ and key not in ('categories', 'images'):
+            raise KeyError(key)
+        return self.get(key)
+
+    def __repr__(self):
+        return f"<ProductRecord {self.id}>"
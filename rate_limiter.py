@@ -0,0 +1,132 @@
+import time
+import heapq
+import asyncio
+import itertools
+import contextvars
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+# Priority classes, lower runs first
+INTERACTIVE = 0
+SYNC = 1
+BATCH = 2
+
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', SYNC: 'sync', BATCH: 'batch'}
+
+# Priority of the store calls made in the current context
+current_priority: contextvars.ContextVar = contextvars.ContextVar('woocommerce_priority', default=INTERACTIVE)
+
+@contextmanager
+def priority(level: int):
+    """Run the enclosed store calls (and tasks started inside) at a priority class"""
+    token = current_priority.set(level)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+class PriorityRateLimiter:
+    """Token bucket shared by all outbound store traffic, granted in priority order
+
+    Waiters are served lowest priority class first, FIFO within a class, so an
+    interactive call always gets the next token ahead of queued sync or batch
+    work. Non-interactive classes also leave `reserve` tokens in the bucket for
+    interactive bursts. block_for() pauses everyone after a 429/Retry-After.
+    """
+
+    def __init__(self, rate: float = 10, burst: int = 20, reserve: int = 2):
+        self.rate = rate
+        self.burst = burst
+        self.reserve = reserve
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._waiters = []
+        self._counter = itertools.count()
+        self._cond: Optional[asyncio.Condition] = None
+
+        # Counters per priority class
+        self.acquired: Dict[int, int] = {level: 0 for level in PRIORITY_NAMES}
+        self.wait_time: Dict[int, float] = {level: 0.0 for level in PRIORITY_NAMES}
+        self.throttled = 0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, level: int = None):
+        """Wait for a token at the given (or current context) priority"""
+        level = current_priority.get() if level is None else level
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+
+        started = time.monotonic()
+        entry = [level, next(self._counter)]
+        needed = 1 if level == INTERACTIVE else 1 + self.reserve
+
+        async with self._cond:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    is_head = self._waiters[0] is entry
+                    delay = max(0.0, self._blocked_until - now)
+
+                    if is_head and delay == 0 and self._tokens >= needed:
+                        heapq.heappop(self._waiters)
+                        self._tokens -= 1
+                        self.acquired[level] = self.acquired.get(level, 0) + 1
+                        self.wait_time[level] = self.wait_time.get(level, 0.0) + now - started
+                        self._cond.notify_all()
+                        return
+
+                    if is_head and delay == 0:
+                        delay = (needed - self._tokens) / self.rate
+
+                    try:
+                        await asyncio.wait_for(self._cond.wait(), timeout=delay if is_head else None)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                    self._cond.notify_all()
+                raise
+
+    def block_for(self, seconds: float):
+        """Stop granting tokens for `seconds` (server asked us to back off)"""
+        self.throttled += 1
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+    def stats(self) -> Dict:
+        return {
+            'rate': self.rate,
+            'tokens': round(min(self.burst, self._tokens), 2),
+            'waiting': len(self._waiters),
+            'throttled': self.throttled,
+            'blocked_for': round(max(0.0, self._blocked_until - time.monotonic()), 2),
+            'acquired': {PRIORITY_NAMES[level]: count for level, count in self.acquired.items()},
+            'avg_wait': {
+                PRIORITY_NAMES[level]: round(self.wait_time[level] / count, 4) if count else 0.0
+                for level, count in self.acquired.items()
+            }
+        }
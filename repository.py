@@ -0,0 +1,158 @@
+import logging
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from sqlalchemy import select, update, insert, func
+from database import AsyncSessionLocal
+from models import User, Conversation, Message, ConversationStatus
+
+class BotRepository:
+    """Async persistence for the bot, built on the shared AsyncSession factory
+
+    Every method opens a short-lived AsyncSession, so handlers await the
+    database directly instead of queueing work on the default thread pool.
+    """
+
+    def __init__(self, session_factory=None):
+        self.session_factory = session_factory or AsyncSessionLocal
+        logging.info("Bot repository initialized")
+
+    # ---- Users ----
+
+    async def get_or_create_user(self, telegram_user) -> User:
+        """Get or create user from Telegram user object"""
+        async with self.session_factory() as session:
+            result = await session.execute(select(User).filter_by(telegram_id=telegram_user.id))
+            user = result.scalars().first()
+
+            if not user:
+                user = User(
+                    telegram_id=telegram_user.id,
+                    username=telegram_user.username,
+                    first_name=telegram_user.first_name,
+                    last_name=telegram_user.last_name,
+                    language_code=telegram_user.language_code or 'fa'
+                )
+                session.add(user)
+            else:
+                # Update last interaction
+                user.last_interaction = datetime.utcnow()
+
+            await session.commit()
+            return user
+
+    async def touch_users(self, last_interactions: Dict[int, datetime]):
+        """Bulk UPDATE of last_interaction by user id"""
+        async with self.session_factory() as session:
+            await session.execute(
+                update(User),
+                [{'id': user_id, 'last_interaction': ts} for user_id, ts in last_interactions.items()]
+            )
+            await session.commit()
+
+    @staticmethod
+    def _recipient_filters(language: Optional[str], active_since: Optional[datetime]) -> list:
+        filters = []
+        if language:
+            filters.append(User.language_code == language)
+        if active_since:
+            filters.append(User.last_interaction >= active_since)
+        return filters
+
+    async def count_users(self, language: str = None, active_since: datetime = None) -> int:
+        """Number of users matching broadcast filters"""
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(func.count(User.id)).where(*self._recipient_filters(language, active_since))
+            )
+            return result.scalar_one()
+
+    async def iter_user_chat_ids(self, language: str = None, active_since: datetime = None,
+                                 batch_size: int = 1000) -> AsyncIterator[List[int]]:
+        """Stream telegram ids of matching users in batches (server-side cursor)"""
+        async with self.session_factory() as session:
+            result = await session.stream(
+                select(User.telegram_id)
+                .where(*self._recipient_filters(language, active_since))
+                .order_by(User.id)
+                .execution_options(yield_per=batch_size)
+            )
+            async for partition in result.partitions(batch_size):
+                yield [row[0] for row in partition]
+
+    # ---- Conversations ----
+
+    async def get_current_conversation(self, user_id: int) -> Optional[Conversation]:
+        """Get the user's active conversation"""
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(Conversation).filter_by(user_id=user_id, status=ConversationStatus.ACTIVE)
+            )
+            return result.scalars().first()
+
+    async def get_or_create_conversation(self, user_id: int) -> Tuple[Conversation, bool]:
+        """Get active conversation or create new one
+
+        Returns:
+            (conversation, created)
+        """
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(Conversation).filter_by(user_id=user_id, status=ConversationStatus.ACTIVE)
+            )
+            conversation = result.scalars().first()
+
+            if conversation:
+                return conversation, False
+
+            conversation = Conversation(user_id=user_id, status=ConversationStatus.ACTIVE)
+            session.add(conversation)
+            await session.commit()
+            return conversation, True
+
+    async def escalate_conversation(self, conversation_id: int):
+        """Mark a conversation as escalated to human support"""
+        async with self.session_factory() as session:
+            await session.execute(
+                update(Conversation)
+                .where(Conversation.id == conversation_id)
+                .values(status=ConversationStatus.ESCALATED, escalated_at=datetime.utcnow())
+            )
+            await session.commit()
+
+    async def save_rating(self, conversation_id: int, rating: int):
+        """Save a satisfaction rating and resolve the conversation"""
+        async with self.session_factory() as session:
+            await session.execute(
+                update(Conversation)
+                .where(Conversation.id == conversation_id)
+                .values(satisfaction_rating=rating, ended_at=datetime.utcnow(),
+                        status=ConversationStatus.RESOLVED)
+            )
+            await session.commit()
+
+    # ---- Messages ----
+
+    async def get_conversation_context(self, conversation_id: int, limit: int = 10) -> List[Dict]:
+        """Last messages of a conversation, oldest first, for the AI"""
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(Message)
+                .filter_by(conversation_id=conversation_id)
+                .order_by(Message.timestamp.desc())
+                .limit(limit)
+            )
+            messages = result.scalars().all()
+
+            return [{
+                'content': msg.content,
+                'is_from_user': msg.is_from_user,
+                'timestamp': msg.timestamp.isoformat()
+            } for msg in reversed(messages)]
+
+    # ---- Events ----
+
+    async def bulk_insert(self, model, rows: List[Dict]):
+        """Insert many rows of one model in a single statement"""
+        async with self.session_factory() as session:
+            await session.execute(insert(model), rows)
+            await session.commit()
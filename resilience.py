@@ -0,0 +1,147 @@
+import time
+import math
+import threading
+from collections import deque
+from typing import Dict
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+class CircuitBreaker:
+    """Circuit breaker for one family of store endpoints
+
+    After `failure_threshold` consecutive failures the circuit opens and calls
+    fail fast. Once `reset_timeout` has passed a single probe is let through
+    (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_started_at = 0.0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """Whether a call may go to the store now"""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == CLOSED:
+                return True
+
+            if self.state == OPEN and now - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self.probe_started_at = now
+                return True
+
+            # Only one probe at a time; a probe that never reported is replaced
+            if self.state == HALF_OPEN and now - self.probe_started_at >= self.reset_timeout:
+                self.probe_started_at = now
+                return True
+
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def stats(self) -> Dict:
+        return {
+            'state': self.state,
+            'consecutive_failures': self.failures,
+            'rejected': self.rejected
+        }
+
+class RetryBudget:
+    """Global retry budget
+
+    Every request deposits `ratio` tokens and every retry spends one, so retries
+    stay a bounded fraction of traffic and cannot amplify an outage. A small
+    per-second allowance keeps retries possible when traffic is low.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 1.0, max_tokens: float = 50):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self._last_refill = time.monotonic()
+        self.retries = 0
+        self.denied = 0
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.max_tokens, self.tokens + (now - self._last_refill) * self.min_per_second)
+        self._last_refill = now
+
+    def record_request(self):
+        with self._lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        """Take one retry from the budget"""
+        with self._lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                self.retries += 1
+                return True
+            self.denied += 1
+            return False
+
+    def stats(self) -> Dict:
+        return {
+            'tokens': round(self.tokens, 2),
+            'retries': self.retries,
+            'denied': self.denied
+        }
+
+class LatencyTracker:
+    """Rolling latency window that derives a timeout from observed p99"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20, multiplier: float = 3.0,
+                 min_timeout: float = 2.0, max_timeout: float = 30.0):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+        self.multiplier = multiplier
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, pct: float) -> float:
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    def timeout(self) -> float:
+        """p99 * multiplier, clamped; the maximum until enough samples are seen"""
+        if len(self.samples) < self.min_samples:
+            return self.max_timeout
+        return max(self.min_timeout, min(self.max_timeout, self.percentile(99) * self.multiplier))
+
+    def stats(self) -> Dict:
+        return {
+            'samples': len(self.samples),
+            'p50': round(self.percentile(50), 3),
+            'p99': round(self.percentile(99), 3),
+            'timeout': round(self.timeout(), 3)
+        }
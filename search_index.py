@@ -0,0 +1,142 @@
+import math
+import bisect
+import logging
+from collections import Counter
+from typing import List, Dict, Iterable, Tuple
+from persian_text import tokenize, strip_html
+
+class ProductSearchIndex:
+    """In-process inverted index over the product catalog with BM25 ranking
+
+    Product names, short descriptions and category names are indexed after
+    Persian/English normalization. Field weights are applied to term
+    frequencies so name matches rank above description matches.
+    """
+
+    FIELD_WEIGHTS = {
+        'name': 3.0,
+        'categories': 2.0,
+        'short_description': 1.0,
+    }
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[int, float]] = {}
+        self._doc_terms: Dict[int, Dict[str, float]] = {}
+        self._doc_lengths: Dict[int, float] = {}
+        self._total_length = 0.0
+        self._vocabulary: List[str] = []
+        self._vocabulary_dirty = False
+
+    def __len__(self):
+        return len(self._doc_terms)
+
+    def _product_terms(self, product: Dict) -> Dict[str, float]:
+        """Weighted term frequencies for one product"""
+        terms: Counter = Counter()
+        fields = {
+            'name': product.get('name', ''),
+            'categories': ' '.join(cat.get('name', '') for cat in product.get('categories', [])),
+            'short_description': strip_html(product.get('short_description', '')),
+        }
+        for field, text in fields.items():
+            weight = self.FIELD_WEIGHTS[field]
+            for token in tokenize(text):
+                terms[token] += weight
+        return dict(terms)
+
+    def rebuild(self, products: Iterable[Dict]):
+        """Build a fresh index and swap it in"""
+        postings: Dict[str, Dict[int, float]] = {}
+        doc_terms: Dict[int, Dict[str, float]] = {}
+        doc_lengths: Dict[int, float] = {}
+
+        for product in products:
+            terms = self._product_terms(product)
+            doc_terms[product['id']] = terms
+            doc_lengths[product['id']] = sum(terms.values())
+            for term, tf in terms.items():
+                postings.setdefault(term, {})[product['id']] = tf
+
+        self._postings = postings
+        self._doc_terms = doc_terms
+        self._doc_lengths = doc_lengths
+        self._total_length = sum(doc_lengths.values())
+        self._vocabulary = sorted(postings)
+        self._vocabulary_dirty = False
+        logging.info(f"Product search index built: {len(doc_terms)} products, {len(postings)} terms")
+
+    def add_product(self, product: Dict):
+        """Index (or re-index) one product"""
+        self.remove_product(product['id'])
+        terms = self._product_terms(product)
+        self._doc_terms[product['id']] = terms
+        self._doc_lengths[product['id']] = sum(terms.values())
+        self._total_length += self._doc_lengths[product['id']]
+        for term, tf in terms.items():
+            if term not in self._postings:
+                self._vocabulary_dirty = True
+            self._postings.setdefault(term, {})[product['id']] = tf
+
+    def remove_product(self, product_id: int):
+        """Drop one product from the index"""
+        terms = self._doc_terms.pop(product_id, None)
+        if terms is None:
+            return
+        self._total_length -= self._doc_lengths.pop(product_id, 0)
+        for term in terms:
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(product_id, None)
+                if not posting:
+                    del self._postings[term]
+                    self._vocabulary_dirty = True
+
+    def _expand_prefix(self, prefix: str, limit: int = 20) -> List[str]:
+        """Vocabulary terms starting with prefix"""
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_dirty = False
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        terms = []
+        for term in self._vocabulary[start:start + limit]:
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+        return terms
+
+    def search(self, query: str, limit: int = 10, prefix: bool = True) -> List[Tuple[int, float]]:
+        """Rank products for a query
+
+        Args:
+            query: Free text in Persian or English
+            limit: Maximum number of results
+            prefix: Also match terms starting with the last query token (type-ahead)
+
+        Returns:
+            List of (product_id, score), best first
+        """
+        tokens = tokenize(query)
+        if not tokens or not self._doc_terms:
+            return []
+
+        query_terms = {token: 1.0 for token in tokens}
+        if prefix:
+            for term in self._expand_prefix(tokens[-1]):
+                query_terms.setdefault(term, 0.5)
+
+        doc_count = len(self._doc_terms)
+        avg_length = self._total_length / doc_count if doc_count else 1.0
+        scores: Dict[int, float] = {}
+
+        for term, query_weight in query_terms.items():
+            posting = self._postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (doc_count - len(posting) + 0.5) / (len(posting) + 0.5))
+            for product_id, tf in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * self._doc_lengths[product_id] / avg_length)
+                scores[product_id] = scores.get(product_id, 0.0) + query_weight * idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
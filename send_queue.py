@@ -0,0 +1,98 @@
+import time
+import random
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Dict
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TimedOut
+from config import Config
+from rate_limiter import PriorityRateLimiter, BATCH
+
+# Outcomes of a send
+SENT = 'sent'
+BLOCKED = 'blocked'  # user blocked the bot or deactivated the account
+FAILED = 'failed'
+
+class TelegramSendQueue:
+    """Outbound Telegram sends paced under the bot's flood limits
+
+    A token bucket (the same PriorityRateLimiter used for store traffic) caps
+    the global rate below Telegram's ~30 msg/s, leaving headroom for handler
+    replies, and each chat gets at most one message per `per_chat_interval`.
+    RetryAfter pauses the whole bucket for the requested time before the send
+    is retried; network errors are retried with jittered backoff.
+    """
+
+    def __init__(self, bot, rate: float = None, per_chat_interval: float = None, max_retries: int = None):
+        self.bot = bot
+        rate = rate or Config.TELEGRAM_SEND_RATE
+        self.limiter = PriorityRateLimiter(rate=rate, burst=max(1, int(rate)), reserve=0)
+        self.per_chat_interval = Config.TELEGRAM_PER_CHAT_INTERVAL if per_chat_interval is None else per_chat_interval
+        self.max_retries = Config.TELEGRAM_SEND_RETRIES if max_retries is None else max_retries
+        self._chat_next: "OrderedDict[int, float]" = OrderedDict()  # chat_id -> earliest next send
+
+        # Counters
+        self.sent = 0
+        self.blocked = 0
+        self.failed = 0
+        self.flood_waits = 0
+        self.retries = 0
+
+    async def _wait_for_chat(self, chat_id: int):
+        now = time.monotonic()
+        # Entries are in send order, so expired ones are at the front
+        while self._chat_next and next(iter(self._chat_next.values())) <= now:
+            self._chat_next.popitem(last=False)
+
+        ready_at = self._chat_next.get(chat_id, 0.0)
+        if ready_at > now:
+            await asyncio.sleep(ready_at - now)
+        self._chat_next.pop(chat_id, None)
+        self._chat_next[chat_id] = time.monotonic() + self.per_chat_interval
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> str:
+        """Send one message, waiting for rate limits and retrying flood waits
+
+        Returns:
+            SENT, BLOCKED or FAILED
+        """
+        attempt = 0
+        while True:
+            await self._wait_for_chat(chat_id)
+            await self.limiter.acquire(BATCH)
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text, **kwargs)
+                self.sent += 1
+                return SENT
+            except RetryAfter as e:
+                retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else e.retry_after
+                self.flood_waits += 1
+                self.limiter.block_for(float(retry_after))
+                logging.warning(f"Telegram flood wait of {retry_after}s")
+                # Flood waits do not use up the retry allowance
+                continue
+            except Forbidden:
+                self.blocked += 1
+                return BLOCKED
+            except BadRequest as e:
+                logging.error(f"Send to {chat_id} rejected: {e}")
+                self.failed += 1
+                return FAILED
+            except (TimedOut, NetworkError) as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    logging.error(f"Send to {chat_id} failed after {attempt} attempts: {e}")
+                    self.failed += 1
+                    return FAILED
+                self.retries += 1
+                await asyncio.sleep(random.uniform(0, 0.5 * 2 ** attempt))
+
+    def stats(self) -> Dict:
+        return {
+            'sent': self.sent,
+            'blocked': self.blocked,
+            'failed': self.failed,
+            'flood_waits': self.flood_waits,
+            'retries': self.retries,
+            'rate_limiter': self.limiter.stats()
+        }
@@ -0,0 +1,251 @@
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from config import Config
+
+class SessionStore(ABC):
+    """Short-lived conversational state per Telegram user, with a TTL
+
+    Values are small JSON-serializable dicts. pop() reads and clears a session
+    atomically, so with a shared backend only one worker acts on a pending
+    prompt such as waiting_for_order_number.
+    """
+
+    def __init__(self, ttl: float = None):
+        self.ttl = Config.SESSION_TTL if ttl is None else ttl
+
+    @abstractmethod
+    async def get(self, user_id: int) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    async def set(self, user_id: int, value: Dict, ttl: float = None):
+        ...
+
+    @abstractmethod
+    async def delete(self, user_id: int):
+        ...
+
+    @abstractmethod
+    async def pop(self, user_id: int) -> Optional[Dict]:
+        """Atomically get and clear a session"""
+
+    async def close(self):
+        pass
+
+    def stats(self) -> Dict:
+        return {'backend': self.__class__.__name__}
+
+class MemorySessionStore(SessionStore):
+    """Process-local LRU store with per-entry expiry"""
+
+    def __init__(self, max_size: int = None, ttl: float = None):
+        super().__init__(ttl)
+        self.max_size = max_size or Config.SESSION_MAX_SIZE
+        self._data: "OrderedDict[int, Tuple[Dict, float]]" = OrderedDict()
+        self.evictions = 0
+
+    def _live(self, user_id: int) -> Optional[Dict]:
+        entry = self._data.get(user_id)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del self._data[user_id]
+            return None
+        return value
+
+    async def get(self, user_id: int) -> Optional[Dict]:
+        return self._live(user_id)
+
+    async def set(self, user_id: int, value: Dict, ttl: float = None):
+        ttl = self.ttl if ttl is None else ttl
+        self._data[user_id] = (value, time.monotonic() + ttl)
+        self._data.move_to_end(user_id)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, user_id: int):
+        self._data.pop(user_id, None)
+
+    async def pop(self, user_id: int) -> Optional[Dict]:
+        # No await between read and delete, so this is atomic on the event loop
+        value = self._live(user_id)
+        self._data.pop(user_id, None)
+        return value
+
+    def stats(self) -> Dict:
+        return {
+            'backend': 'memory',
+            'size': len(self._data),
+            'max_size': self.max_size,
+            'evictions': self.evictions
+        }
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions in an SQLite file, shared by workers on the same host"""
+
+    PURGE_EVERY = 100  # writes between sweeps of expired rows
+    HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+    def __init__(self, db_path: str = None, ttl: float = None):
+        super().__init__(ttl)
+        self.db_path = db_path or Config.SESSION_DB_PATH
+        self._lock = threading.Lock()
+        # Autocommit mode; pop() opens its own IMMEDIATE transaction
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                user_id INTEGER PRIMARY KEY,
+                data TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        self._writes = 0
+        logging.info(f"Session store opened: {self.db_path}")
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, fn, *args)
+
+    def _sync_get(self, user_id: int) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM sessions WHERE user_id = ? AND expires_at > ?", (user_id, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _sync_set(self, user_id: int, value: Dict, ttl: float):
+        with self._lock:
+            now = time.time()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (user_id, data, expires_at) VALUES (?, ?, ?)",
+                (user_id, json.dumps(value, ensure_ascii=False), now + ttl)
+            )
+            self._writes += 1
+            if self._writes % self.PURGE_EVERY == 0:
+                self._conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+
+    def _sync_delete(self, user_id: int):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+
+    def _sync_pop(self, user_id: int) -> Optional[Dict]:
+        if self.HAS_RETURNING:
+            # A single autocommit statement: atomic, and no transaction round trips
+            with self._lock:
+                row = self._conn.execute(
+                    "DELETE FROM sessions WHERE user_id = ? RETURNING data, expires_at", (user_id,)
+                ).fetchone()
+            if not row or row[1] <= time.time():
+                return None
+            return json.loads(row[0])
+
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so no other process can pop in between
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT data, expires_at FROM sessions WHERE user_id = ?", (user_id,)
+                ).fetchone()
+                if row:
+                    self._conn.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if not row or row[1] <= time.time():
+            return None
+        return json.loads(row[0])
+
+    async def get(self, user_id: int) -> Optional[Dict]:
+        return await self._run(self._sync_get, user_id)
+
+    async def set(self, user_id: int, value: Dict, ttl: float = None):
+        await self._run(self._sync_set, user_id, value, self.ttl if ttl is None else ttl)
+
+    async def delete(self, user_id: int):
+        await self._run(self._sync_delete, user_id)
+
+    async def pop(self, user_id: int) -> Optional[Dict]:
+        return await self._run(self._sync_pop, user_id)
+
+    async def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        return {'backend': 'sqlite', 'size': size, 'db_path': self.db_path}
+
+class RedisSessionStore(SessionStore):
+    """Sessions in Redis (or anything speaking its protocol), shared by all workers
+
+    Pass `client` to use an existing redis.asyncio-compatible client, e.g. a
+    local stand-in in development.
+    """
+
+    def __init__(self, url: str = None, client=None, prefix: str = 'telewpbot:session:', ttl: float = None):
+        super().__init__(ttl)
+        if client is None:
+            import redis.asyncio as redis  # only needed for this backend
+            client = redis.from_url(url or Config.REDIS_URL)
+        self.client = client
+        self.prefix = prefix
+        self._getdel = True  # cleared if the server predates GETDEL (Redis < 6.2)
+
+    def _key(self, user_id: int) -> str:
+        return f"{self.prefix}{user_id}"
+
+    async def get(self, user_id: int) -> Optional[Dict]:
+        data = await self.client.get(self._key(user_id))
+        return json.loads(data) if data else None
+
+    async def set(self, user_id: int, value: Dict, ttl: float = None):
+        ttl = self.ttl if ttl is None else ttl
+        await self.client.set(self._key(user_id), json.dumps(value, ensure_ascii=False), px=int(ttl * 1000))
+
+    async def delete(self, user_id: int):
+        await self.client.delete(self._key(user_id))
+
+    async def pop(self, user_id: int) -> Optional[Dict]:
+        key = self._key(user_id)
+        if self._getdel:
+            try:
+                data = await self.client.getdel(key)
+                return json.loads(data) if data else None
+            except Exception as e:
+                if 'unknown command' not in str(e).lower():
+                    raise
+                logging.warning("Redis server has no GETDEL, popping sessions with MULTI/EXEC")
+                self._getdel = False
+
+        async with self.client.pipeline(transaction=True) as pipe:
+            data, _ = await pipe.get(key).delete(key).execute()
+        return json.loads(data) if data else None
+
+    async def close(self):
+        await self.client.aclose()
+
+    def stats(self) -> Dict:
+        return {'backend': 'redis', 'prefix': self.prefix}
+
+def create_session_store(backend: str = None) -> SessionStore:
+    """Build the session store selected by SESSION_BACKEND"""
+    backend = (backend or Config.SESSION_BACKEND).lower()
+    if backend == 'sqlite':
+        return SQLiteSessionStore()
+    if backend == 'redis':
+        return RedisSessionStore()
+    if backend != 'memory':
+        logging.warning(f"Unknown session backend {backend!r}, using memory")
+    return MemorySessionStore()
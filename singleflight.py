@@ -0,0 +1,47 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+class SingleFlight:
+    """Coalesce concurrent identical async calls into one in-flight call
+
+    The first caller for a key starts the call; everyone arriving while it is
+    running awaits the same result. The call runs as its own task so a caller
+    being cancelled does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+        # Counters
+        self.calls = 0
+        self.executions = 0
+        self.collapsed = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run fn() for key, or join the call already in flight"""
+        self.calls += 1
+        task = self._inflight.get(key)
+
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+            self.executions += 1
+        else:
+            self.collapsed += 1
+
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def stats(self) -> Dict:
+        """Counters for the dashboard"""
+        return {
+            'calls': self.calls,
+            'executions': self.executions,
+            'collapsed': self.collapsed,
+            'in_flight': len(self._inflight),
+            'collapse_rate': round(self.collapsed / self.calls * 100, 2) if self.calls else 0.0
+        }
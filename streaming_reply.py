@@ -0,0 +1,79 @@
+import time
+import asyncio
+import logging
+from typing import Optional
+from telegram import Message
+from telegram.error import BadRequest, RetryAfter
+from config import Config
+
+# Telegram's limit for a text message
+MAX_MESSAGE_LENGTH = 4096
+
+# Flood waits sat out before giving up on the final edit
+FINAL_EDIT_ATTEMPTS = 3
+
+class StreamingReply:
+    """A Telegram message edited in place as streamed text arrives
+
+    start() sends a placeholder, update() is called with the accumulated text
+    and edits the message at most once per `interval` seconds (the first text
+    is shown straight away), finish() writes the final text. Mid-stream edits
+    that fail (rate limits, unchanged text) are skipped and the next update
+    catches up; finish() waits out flood limits so the cursor never stays.
+    """
+
+    def __init__(self, message: Message, placeholder: str, interval: float = None, cursor: str = ' ▌'):
+        self.message = message
+        self.placeholder = placeholder
+        self.interval = Config.AI_STREAM_EDIT_INTERVAL if interval is None else interval
+        self.cursor = cursor
+        self.sent: Optional[Message] = None
+        self._shown = ''
+        self._last_edit = 0.0
+        self._blocked_until = 0.0
+        self.edits = 0
+
+    async def start(self):
+        """Send the placeholder message"""
+        # _last_edit stays unset so the first tokens replace the placeholder immediately
+        self.sent = await self.message.reply_text(self.placeholder)
+
+    async def update(self, text: str):
+        """Show the text so far, if the edit interval has passed"""
+        now = time.monotonic()
+        if not self.sent or not text.strip() or now - self._last_edit < self.interval or now < self._blocked_until:
+            return
+        await self._edit(text[:MAX_MESSAGE_LENGTH - len(self.cursor)] + self.cursor)
+
+    async def finish(self, text: str):
+        """Replace the message with the final text"""
+        text = text[:MAX_MESSAGE_LENGTH]
+        if not self.sent:
+            self.sent = await self.message.reply_text(text)
+            return
+        for _ in range(FINAL_EDIT_ATTEMPTS):
+            delay = self._blocked_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if await self._edit(text):
+                return
+        logging.error(f"Final streaming edit of message {self.sent.message_id} kept hitting flood limits")
+
+    async def _edit(self, text: str) -> bool:
+        """Edit the message; False only when a flood limit got in the way"""
+        if text == self._shown:
+            return True
+        try:
+            await self.sent.edit_text(text)
+            self._shown = text
+            self.edits += 1
+        except RetryAfter as e:
+            retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else e.retry_after
+            self._blocked_until = time.monotonic() + retry_after
+            return False
+        except BadRequest as e:
+            # "Message is not modified" and similar are harmless mid-stream
+            logging.debug(f"Streaming edit skipped: {e}")
+        finally:
+            self._last_edit = time.monotonic()
+        return True
@@ -0,0 +1,76 @@
+import asyncio
+from sqlalchemy.exc import IntegrityError, OperationalError
+from event_sink import EventSink, Message
+
+class FakeRepository:
+    """bulk_insert that can be switched off, or made to reject particular rows"""
+
+    def __init__(self):
+        self.rows = []
+        self.calls = 0
+        self.down = False
+        self.bad = set()
+
+    async def bulk_insert(self, model, rows):
+        self.calls += 1
+        if self.down:
+            raise OperationalError('INSERT', {}, ConnectionRefusedError('database is down'))
+        if any(row['content'] in self.bad for row in rows):
+            raise IntegrityError('INSERT', {}, ValueError('rejected'))
+        self.rows.extend(rows)
+
+def test_database_down_keeps_rows_and_backs_off():
+    repository = FakeRepository()
+    repository.down = True
+    sink = EventSink(repository, flush_interval=0.5, max_batch=10, max_buffered=1000, max_retries=3)
+
+    async def scenario():
+        sink.start()
+        for index in range(200):
+            sink.record_message(1, f"m{index}")
+            if index % 10 == 0:
+                await asyncio.sleep(0.015)
+        await asyncio.sleep(0.1)
+
+        # Nothing dropped, and retries wait for the backoff instead of running on every size wakeup
+        assert sink.dropped == 0
+        assert sink.stats()['buffered'] == 200
+        assert repository.calls <= 3
+
+        repository.down = False
+        await sink.stop()
+
+    asyncio.run(scenario())
+    assert [row['content'] for row in repository.rows] == [f"m{index}" for index in range(200)]
+    assert sink.dropped == 0
+
+def test_rejected_rows_are_dropped_one_by_one_after_retries():
+    repository = FakeRepository()
+    repository.bad = {'bad'}
+    sink = EventSink(repository, flush_interval=0.5, max_batch=100, max_buffered=1000, max_retries=2)
+
+    async def scenario():
+        for content in ('a', 'bad', 'b'):
+            sink.record_message(1, content)
+        for _ in range(3):
+            await sink.flush(force=True)
+
+    asyncio.run(scenario())
+    assert [row['content'] for row in repository.rows] == ['a', 'b']
+    assert sink.dropped == 1
+    assert sink.stats()['buffered'] == 0
+
+def test_requeued_rows_skip_flush_during_backoff():
+    repository = FakeRepository()
+    repository.down = True
+    sink = EventSink(repository, flush_interval=0.5, max_batch=100, max_buffered=1000, max_retries=1)
+
+    async def scenario():
+        sink.record_message(1, 'a')
+        await sink.flush()
+        await sink.flush()
+        await sink.flush()
+
+    asyncio.run(scenario())
+    assert repository.calls == 1
+    assert sink._buffers[Message][0]['content'] == 'a'
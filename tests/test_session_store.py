@@ -0,0 +1,104 @@
+import json
+import asyncio
+import pytest
+from session_store import SessionStore, SQLiteSessionStore, RedisSessionStore
+
+class FakePipeline:
+    """Queues get/delete and runs them together, like a MULTI/EXEC pipeline"""
+
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def get(self, key):
+        self.commands.append(('get', key))
+        return self
+
+    def delete(self, key):
+        self.commands.append(('delete', key))
+        return self
+
+    async def execute(self):
+        self.client.executed += 1
+        results = []
+        for command, key in self.commands:
+            if command == 'get':
+                results.append(self.client.data.get(key))
+            else:
+                results.append(int(self.client.data.pop(key, None) is not None))
+        return results
+
+class FakeRedis:
+    """Just enough of redis.asyncio for RedisSessionStore"""
+
+    def __init__(self, getdel: bool = True):
+        self.data = {}
+        self.has_getdel = getdel
+        self.executed = 0
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, px=None):
+        self.data[key] = value.encode()
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+    async def getdel(self, key):
+        if not self.has_getdel:
+            raise Exception("unknown command 'GETDEL'")
+        return self.data.pop(key, None)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+def test_session_store_is_abstract():
+    with pytest.raises(TypeError):
+        SessionStore()
+
+@pytest.mark.parametrize('getdel', [True, False])
+def test_redis_pop_returns_and_clears_session(getdel):
+    client = FakeRedis(getdel=getdel)
+    store = RedisSessionStore(client=client, ttl=60)
+
+    async def scenario():
+        await store.set(1, {'waiting_for_order_number': True})
+        assert await store.pop(1) == {'waiting_for_order_number': True}
+        assert await store.pop(1) is None
+        assert await store.get(1) is None
+
+    asyncio.run(scenario())
+    assert not client.data
+    assert store._getdel is getdel
+    # The MULTI/EXEC fallback is only used when the server lacks GETDEL
+    assert client.executed == (0 if getdel else 2)
+
+def test_redis_pop_missing_session():
+    store = RedisSessionStore(client=FakeRedis(), ttl=60)
+    assert asyncio.run(store.pop(42)) is None
+
+def test_sqlite_pop(tmp_path):
+    store = SQLiteSessionStore(db_path=str(tmp_path / 'sessions.db'), ttl=60)
+
+    async def scenario():
+        await store.set(1, {'step': 'order'})
+        await store.set(2, {'step': 'old'}, ttl=-1)
+        assert await store.pop(1) == {'step': 'order'}
+        assert await store.pop(1) is None
+        assert await store.pop(2) is None
+        await store.close()
+
+    asyncio.run(scenario())
+
+def test_redis_values_are_json():
+    client = FakeRedis()
+    store = RedisSessionStore(client=client, prefix='p:', ttl=60)
+    asyncio.run(store.set(7, {'a': 'سلام'}))
+    assert json.loads(client.data['p:7']) == {'a': 'سلام'}
@@ -0,0 +1,72 @@
+import asyncio
+from typing import Awaitable, Dict, Optional
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Process updates concurrently, but one at a time per chat
+
+    Up to `max_concurrent_updates` handlers run at once. Updates from the same
+    chat (or user, for updates without a chat) queue on a per-chat lock, which
+    is FIFO, so each user's messages and button presses keep their order. The
+    chat lock is taken before the global slot, so a busy chat never holds slots
+    other chats could use.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._chat_locks: Dict[int, asyncio.Lock] = {}
+        self._chat_waiters: Dict[int, int] = {}
+        # Counted here: current_concurrent_updates only exists in newer python-telegram-bot releases
+        self._running = 0
+
+    @staticmethod
+    def _chat_key(update: object) -> Optional[int]:
+        if not isinstance(update, Update):
+            return None
+        if update.effective_chat:
+            return update.effective_chat.id
+        if update.effective_user:
+            return update.effective_user.id
+        return None
+
+    async def process_update(self, update: object, coroutine: Awaitable):
+        key = self._chat_key(update)
+        if key is None:
+            await super().process_update(update, coroutine)
+            return
+
+        lock = self._chat_locks.get(key)
+        if lock is None:
+            lock = self._chat_locks[key] = asyncio.Lock()
+        self._chat_waiters[key] = self._chat_waiters.get(key, 0) + 1
+        try:
+            async with lock:
+                await super().process_update(update, coroutine)
+        finally:
+            self._chat_waiters[key] -= 1
+            if not self._chat_waiters[key]:
+                # Drop idle chats so the maps stay bounded by active chats
+                del self._chat_waiters[key]
+                del self._chat_locks[key]
+
+    async def do_process_update(self, update: object, coroutine: Awaitable):
+        self._running += 1
+        try:
+            await coroutine
+        finally:
+            self._running -= 1
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def stats(self) -> Dict:
+        return {
+            'max_concurrent_updates': self.max_concurrent_updates,
+            'current_concurrent_updates': self._running,
+            'active_chats': len(self._chat_locks),
+            'queued': sum(self._chat_waiters.values()) - len(self._chat_waiters)
+        }
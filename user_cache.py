@@ -0,0 +1,99 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict
+from config import Config
+
+class UserCache:
+    """Bounded LRU cache of telegram_id -> User with coalesced last_interaction writes
+
+    Cache hits only mark the user dirty; dirty users get one bulk UPDATE of
+    last_interaction per flush interval no matter how often they click.
+    """
+
+    def __init__(self, repository, max_size: int = None, flush_interval: float = None):
+        self.repository = repository
+        self.max_size = max_size or Config.USER_CACHE_MAX_SIZE
+        self.flush_interval = flush_interval or Config.USER_TOUCH_FLUSH_INTERVAL
+        self._users: "OrderedDict[int, object]" = OrderedDict()
+        self._dirty: Dict[int, datetime] = {}
+        self._task = None
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.updates_written = 0
+
+    async def get_or_create(self, telegram_user):
+        """Cached user for a Telegram user, loading (and creating) on a miss"""
+        user = self._users.get(telegram_user.id)
+        if user is not None:
+            self._users.move_to_end(telegram_user.id)
+            self.hits += 1
+            now = datetime.utcnow()
+            user.last_interaction = now
+            self._dirty[user.id] = now
+            return user
+
+        self.misses += 1
+        user = await self.repository.get_or_create_user(telegram_user)
+        self.put(user)
+        return user
+
+    def get(self, telegram_id: int):
+        """Cached user without loading"""
+        return self._users.get(telegram_id)
+
+    def put(self, user):
+        self._users[user.telegram_id] = user
+        self._users.move_to_end(user.telegram_id)
+        while len(self._users) > self.max_size:
+            self._users.popitem(last=False)
+            self.evictions += 1
+
+    async def flush(self):
+        """Write pending last_interaction updates in one bulk UPDATE"""
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        try:
+            await self.repository.touch_users(dirty)
+            self.updates_written += len(dirty)
+        except Exception as e:
+            logging.error(f"Failed to update last_interaction for {len(dirty)} users: {e}")
+            # Keep the newest timestamp for a later attempt
+            for user_id, ts in dirty.items():
+                self._dirty.setdefault(user_id, ts)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        """Start the periodic flusher"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flusher and write what is pending"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> Dict:
+        return {
+            'size': len(self._users),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'dirty': len(self._dirty),
+            'updates_written': self.updates_written
+        }
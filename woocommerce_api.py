@@ -1,7 +1,27 @@
+import time
+import random
 import requests
+import httpx
+import asyncio
 import logging
-from typing import List, Dict, Optional
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Dict, Optional
 from config import Config
+from cache import TTLCache, FRESH, STALE
+from singleflight import SingleFlight
+from persian_text import normalize, strip_html
+from resilience import CircuitBreaker, RetryBudget, LatencyTracker
+from product_record import LISTING_FIELDS, API_SORTS, POPULAR
+from rate_limiter import PriorityRateLimiter, parse_retry_after, priority, SYNC
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+class WooCommerceAPIError(Exception):
+    """Raised when a WooCommerce request that cannot degrade to None fails"""
 
 class WooCommerceAPI:
     """WooCommerce REST API client"""
@@ -147,8 +167,7 @@ class WooCommerceAPI:
             description = product.get('short_description', '')
             
             # Remove HTML tags from description
-            import re
-            description = re.sub('<.*?>', '', description).strip()
+            description = strip_html(description)
             
             stock_text = 'موجود' if stock_status == 'instock' else 'ناموجود'
             if language == 'en':
@@ -235,3 +254,461 @@ class WooCommerceAPI:
         except Exception as e:
             logging.error(f"Error formatting order message: {e}")
             return "خطا در نمایش اطلاعات سفارش" if language == 'fa' else "Error displaying order information"
+
+
+class AsyncWooCommerceAPI(WooCommerceAPI):
+    """Async WooCommerce REST API client backed by a shared keep-alive connection pool.
+    
+    All bot handlers await this client so a slow store call only blocks the chat
+    that made it. The pool talks to a single host, so the pool limits are the
+    per-host connection limits.
+    """
+    
+    def __init__(self, timeout: float = None, connect_timeout: float = None,
+                 max_connections: int = None, max_keepalive: int = None, http2: bool = None):
+        super().__init__()
+        
+        self.timeout = httpx.Timeout(
+            timeout if timeout is not None else Config.WOOCOMMERCE_TIMEOUT,
+            connect=connect_timeout if connect_timeout is not None else Config.WOOCOMMERCE_CONNECT_TIMEOUT
+        )
+        self.limits = httpx.Limits(
+            max_connections=max_connections or Config.WOOCOMMERCE_MAX_CONNECTIONS,
+            max_keepalive_connections=max_keepalive or Config.WOOCOMMERCE_MAX_KEEPALIVE,
+            keepalive_expiry=Config.WOOCOMMERCE_KEEPALIVE_EXPIRY
+        )
+        
+        use_http2 = Config.WOOCOMMERCE_HTTP2 if http2 is None else http2
+        if use_http2 and not HTTP2_AVAILABLE:
+            logging.warning("HTTP/2 requested for WooCommerce but 'h2' is not installed, using HTTP/1.1")
+            use_http2 = False
+        self.http2 = use_http2
+        
+        self._client: Optional[httpx.AsyncClient] = None
+        
+        # Response cache for catalog reads
+        self.cache = TTLCache(max_size=Config.CACHE_MAX_SIZE, stale_ttl=Config.CACHE_STALE_TTL)
+        self._refreshing = set()
+        self._background_tasks = set()
+        
+        # Concurrent identical GETs share one in-flight request
+        self._singleflight = SingleFlight()
+        
+        # Failure handling per endpoint family
+        self.breakers = {
+            family: CircuitBreaker(family, Config.WOOCOMMERCE_BREAKER_THRESHOLD, Config.WOOCOMMERCE_BREAKER_RESET)
+            for family in ('products', 'categories', 'orders', 'other')
+        }
+        self.latency = {
+            family: LatencyTracker(min_timeout=Config.WOOCOMMERCE_MIN_TIMEOUT, max_timeout=self.timeout.read)
+            for family in self.breakers
+        }
+        self.retry_budget = RetryBudget(ratio=Config.WOOCOMMERCE_RETRY_RATIO)
+        
+        # Outbound rate limit shared by interactive, sync and batch traffic
+        self.rate_limiter = PriorityRateLimiter(rate=Config.WOOCOMMERCE_RATE_LIMIT,
+                                                burst=Config.WOOCOMMERCE_RATE_BURST,
+                                                reserve=Config.WOOCOMMERCE_RATE_RESERVE)
+        
+        # Order lookups: order number -> order id (long-lived), order id -> order (short TTL)
+        self.order_ids = TTLCache(max_size=Config.ORDER_CACHE_MAX_SIZE, default_ttl=Config.ORDER_ID_CACHE_TTL)
+        self.order_cache = TTLCache(max_size=Config.ORDER_CACHE_MAX_SIZE, default_ttl=Config.ORDER_CACHE_TTL)
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Lazily create the pooled client inside the running event loop"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.api_url,
+                auth=self.auth,
+                headers=self.headers,
+                timeout=self.timeout,
+                limits=self.limits,
+                http2=self.http2
+            )
+        return self._client
+    
+    async def aclose(self):
+        """Close the connection pool"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+    
+    async def _make_request(self, endpoint: str, method: str = 'GET', params: Dict = None, data: Dict = None) -> Optional[Dict]:
+        """Make a request to WooCommerce API, coalescing concurrent identical GETs"""
+        if method == 'GET' and data is None:
+            key = self._cache_key(endpoint, params)
+            return await self._singleflight.do(key, lambda: self._send_request(endpoint, method, params, data))
+        
+        return await self._send_request(endpoint, method, params, data)
+    
+    async def _send_request(self, endpoint: str, method: str = 'GET', params: Dict = None, data: Dict = None) -> Optional[Dict]:
+        """Send one request and decode the JSON body"""
+        response = await self._send(endpoint, method, params, data)
+        return response.json() if response is not None else None
+    
+    @staticmethod
+    def _endpoint_family(endpoint: str) -> str:
+        """Circuit breaker family for an endpoint"""
+        if endpoint.startswith('products/categories'):
+            return 'categories'
+        if endpoint.startswith('products'):
+            return 'products'
+        if endpoint.startswith('orders'):
+            return 'orders'
+        return 'other'
+    
+    async def _send(self, endpoint: str, method: str = 'GET', params: Dict = None, data: Dict = None) -> Optional[httpx.Response]:
+        """Send one request over the shared connection pool, returning the response on HTTP 200
+        
+        Fails fast while the endpoint family's circuit is open, waits for a
+        rate-limiter token at the caller's priority, uses a timeout derived from
+        observed latency, and retries idempotent GETs with jittered backoff as
+        long as the global retry budget allows. 429 and Retry-After responses
+        pause all outbound traffic for the requested time.
+        """
+        family = self._endpoint_family(endpoint)
+        breaker = self.breakers[family]
+        latency = self.latency[family]
+        self.retry_budget.record_request()
+        attempt = 0
+        
+        while True:
+            if not breaker.allow_request():
+                logging.warning(f"WooCommerce circuit open for {family}, failing fast: {endpoint}")
+                return None
+            
+            await self.rate_limiter.acquire()
+            
+            started = time.monotonic()
+            backoff = None
+            try:
+                response = await self.client.request(
+                    method=method,
+                    url=f"/{endpoint}",
+                    params=params,
+                    json=data,
+                    timeout=httpx.Timeout(latency.timeout(), connect=self.timeout.connect)
+                )
+            except httpx.HTTPError as e:
+                latency.observe(time.monotonic() - started)
+                breaker.record_failure()
+                error = f"WooCommerce API request failed: {e!r}"
+            else:
+                latency.observe(time.monotonic() - started)
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                
+                if response.status_code == 429 or (response.status_code == 503 and retry_after is not None):
+                    # Throttled by the host: back off everyone, not just this call
+                    backoff = retry_after if retry_after is not None else Config.WOOCOMMERCE_RETRY_BACKOFF * 2 ** (attempt + 1)
+                    self.rate_limiter.block_for(backoff)
+                    error = f"WooCommerce API throttled: {response.status_code}, retry after {backoff:.1f}s"
+                elif response.status_code < 500:
+                    breaker.record_success()
+                    if response.status_code == 200:
+                        return response
+                    logging.error(f"WooCommerce API error: {response.status_code} - {response.text}")
+                    return None
+                else:
+                    breaker.record_failure()
+                    error = f"WooCommerce API error: {response.status_code} - {response.text}"
+            
+            if method != 'GET' or attempt >= Config.WOOCOMMERCE_MAX_RETRIES or not self.retry_budget.try_spend():
+                logging.error(error)
+                return None
+            
+            attempt += 1
+            logging.warning(f"{error} (retry {attempt})")
+            if backoff is None:
+                await asyncio.sleep(random.uniform(0, Config.WOOCOMMERCE_RETRY_BACKOFF * 2 ** attempt))
+    
+    @staticmethod
+    def _cache_key(endpoint: str, params: Dict = None) -> tuple:
+        return (endpoint, tuple(sorted((params or {}).items())))
+    
+    async def _cached_request(self, cache_name: str, endpoint: str, params: Dict = None) -> Optional[Dict]:
+        """GET through the response cache"""
+        return await self._cached(cache_name, self._cache_key(endpoint, params),
+                                  lambda: self._make_request(endpoint, params=params))
+    
+    async def _cached(self, cache_name: str, key: tuple, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Serve from the response cache, returning stale entries while refreshing in the background"""
+        value, state = self.cache.get(key)
+        
+        if state == FRESH:
+            return value
+        
+        if state == STALE:
+            if key not in self._refreshing:
+                self._refreshing.add(key)
+                task = asyncio.create_task(self._refresh(cache_name, key, loader))
+                self._background_tasks.add(task)
+                task.add_done_callback(self._background_tasks.discard)
+            return value
+        
+        value = await loader()
+        if value is not None:
+            self.cache.set(key, value, Config.CACHE_TTLS[cache_name])
+            return value
+        
+        # Store unavailable: fall back to whatever we last saw
+        return self.cache.peek(key)
+    
+    async def _refresh(self, cache_name: str, key: tuple, loader: Callable[[], Awaitable[Any]]):
+        """Background refresh of a stale cache entry"""
+        try:
+            with priority(SYNC):
+                value = await loader()
+            if value is not None:
+                self.cache.set(key, value, Config.CACHE_TTLS[cache_name])
+        except Exception as e:
+            # Nothing awaits this task, so log here or the error is lost; the stale value stays
+            logging.error(f"Background refresh of {cache_name} {key} failed: {e}")
+        finally:
+            self._refreshing.discard(key)
+    
+    async def iter_collection(self, endpoint: str, params: Dict = None, per_page: int = 100,
+                              concurrency: int = None) -> AsyncIterator[Dict]:
+        """Stream every item of a paginated collection
+        
+        The first page reports X-WP-TotalPages; the remaining pages are fetched
+        concurrently with at most `concurrency` requests in flight and yielded
+        in page order, so only a bounded window of pages is held in memory.
+        
+        Raises:
+            WooCommerceAPIError: if a page cannot be fetched
+        """
+        concurrency = concurrency or Config.WOOCOMMERCE_PAGE_CONCURRENCY
+        base_params = dict(params or {}, per_page=per_page)
+        
+        async def fetch_page(page: int) -> List[Dict]:
+            response = await self._send(endpoint, params=dict(base_params, page=page))
+            if response is None:
+                raise WooCommerceAPIError(f"Failed to fetch {endpoint} page {page}")
+            return response.json()
+        
+        first = await self._send(endpoint, params=dict(base_params, page=1))
+        if first is None:
+            raise WooCommerceAPIError(f"Failed to fetch {endpoint} page 1")
+        
+        total_pages = int(first.headers.get('X-WP-TotalPages', 1) or 1)
+        for item in first.json():
+            yield item
+        
+        window = deque()
+        next_page = 2
+        try:
+            while next_page <= total_pages or window:
+                while next_page <= total_pages and len(window) < concurrency:
+                    window.append(asyncio.ensure_future(fetch_page(next_page)))
+                    next_page += 1
+                
+                for item in await window.popleft():
+                    yield item
+        finally:
+            for task in window:
+                task.cancel()
+    
+    def iter_products(self, modified_after: str = None, per_page: int = 100,
+                      concurrency: int = None, fields: str = None) -> AsyncIterator[Dict]:
+        """Stream the whole product catalog
+        
+        With modified_after (GMT, ISO 8601) unpublished products are included too
+        so callers can drop them from local copies. `fields` limits the JSON to
+        a comma-separated field list.
+        """
+        params = {
+            'orderby': 'id',
+            'order': 'asc',
+            'status': 'publish'
+        }
+        
+        if fields:
+            params['_fields'] = fields
+        
+        if modified_after:
+            params['status'] = 'any'
+            params['modified_after'] = modified_after
+            params['dates_are_gmt'] = 'true'
+        
+        return self.iter_collection('products', params=params, per_page=per_page, concurrency=concurrency)
+    
+    def iter_categories(self, per_page: int = 100, concurrency: int = None, fields: str = None) -> AsyncIterator[Dict]:
+        """Stream every product category"""
+        params = {
+            'orderby': 'name',
+            'order': 'asc'
+        }
+        
+        if fields:
+            params['_fields'] = fields
+        
+        return self.iter_collection('products/categories', params=params, per_page=per_page, concurrency=concurrency)
+    
+    async def _load_all_categories(self, per_page: int) -> Optional[List[Dict]]:
+        try:
+            return [category async for category in self.iter_categories(per_page=per_page)]
+        except WooCommerceAPIError as e:
+            logging.error(str(e))
+            return None
+    
+    def cache_stats(self) -> Dict:
+        """Response cache counters for the dashboard"""
+        return self.cache.stats()
+    
+    def stats(self) -> Dict:
+        """Client counters for the dashboard"""
+        return {
+            'cache': self.cache.stats(),
+            'coalescing': self._singleflight.stats(),
+            'order_cache': self.order_cache.stats(),
+            'breakers': {family: breaker.stats() for family, breaker in self.breakers.items()},
+            'latency': {family: tracker.stats() for family, tracker in self.latency.items()},
+            'retry_budget': self.retry_budget.stats(),
+            'rate_limiter': self.rate_limiter.stats()
+        }
+    
+    async def get_categories(self, per_page: int = 100) -> List[Dict]:
+        """Get every product category, walking all pages"""
+        categories = await self._cached('categories', ('products/categories', 'all'),
+                                        lambda: self._load_all_categories(per_page))
+        
+        if categories is None:
+            logging.error("Failed to fetch categories from WooCommerce")
+            return []
+        
+        # Filter out categories with no products
+        return [cat for cat in categories if cat.get('count', 0) > 0]
+    
+    async def get_products(self, category_id: int = None, per_page: int = 20, page: int = 1,
+                           fields: Optional[str] = LISTING_FIELDS, sort: str = POPULAR) -> List[Dict]:
+        """Get products, optionally filtered by category
+        
+        Only the listing fields are requested by default; pass fields=None for
+        full product JSON.
+        """
+        orderby, order = API_SORTS.get(sort, API_SORTS[POPULAR])
+        params = {
+            'per_page': per_page,
+            'page': page,
+            'status': 'publish',
+            'orderby': orderby,
+            'order': order
+        }
+        
+        if fields:
+            params['_fields'] = fields
+        
+        if category_id:
+            params['category'] = category_id
+        
+        products = await self._cached_request('products', 'products', params=params)
+        
+        if products is None:
+            logging.error("Failed to fetch products from WooCommerce")
+            return []
+        
+        return products
+    
+    async def get_product(self, product_id: int) -> Optional[Dict]:
+        """Get a specific product by ID"""
+        product = await self._cached_request('product', f'products/{product_id}')
+        
+        if product is None:
+            logging.error(f"Failed to fetch product {product_id} from WooCommerce")
+        
+        return product
+    
+    async def search_products(self, search_term: str, per_page: int = 20,
+                              fields: Optional[str] = LISTING_FIELDS) -> List[Dict]:
+        """Search for products (listing fields only by default)"""
+        params = {
+            'search': search_term,
+            'per_page': per_page,
+            'status': 'publish'
+        }
+        
+        if fields:
+            params['_fields'] = fields
+        
+        products = await self._make_request('products', params=params)
+        
+        if products is None:
+            logging.error(f"Failed to search products for term: {search_term}")
+            return []
+        
+        return products
+    
+    async def get_order(self, order_id: int) -> Optional[Dict]:
+        """Get order details by ID"""
+        order, state = self.order_cache.get(order_id)
+        if state == FRESH:
+            return order
+        
+        order = await self._make_request(f'orders/{order_id}')
+        
+        if order is None:
+            logging.error(f"Failed to fetch order {order_id} from WooCommerce")
+            order = self.order_cache.peek(order_id)
+        else:
+            self._remember_order(order)
+        
+        return order
+    
+    def _remember_order(self, order: Dict):
+        """Cache an order and its number -> id mapping"""
+        self.order_cache.set(order['id'], order)
+        if order.get('number'):
+            self.order_ids.set(str(order['number']), order['id'])
+    
+    def invalidate_order(self, order_id: int):
+        """Drop a cached order so the next lookup refetches it"""
+        self.order_cache.invalidate(order_id)
+    
+    def update_cached_order(self, order: Dict):
+        """Replace a cached order with a pushed copy (e.g. from a webhook)"""
+        self._remember_order(order)
+    
+    def invalidate_product(self, product_id: int):
+        """Drop a product and every cached product listing"""
+        self.cache.invalidate(self._cache_key(f'products/{product_id}'))
+        self.cache.invalidate_where(lambda key: key[0] == 'products')
+    
+    def invalidate_categories(self):
+        """Drop cached category listings"""
+        self.cache.invalidate_where(lambda key: key[0] == 'products/categories')
+    
+    async def search_order_by_number(self, order_number: str) -> Optional[Dict]:
+        """Search for order by order number
+        
+        Known numbers and numeric numbers go straight to orders/{id}; the
+        full-text order search is only used when that does not match.
+        """
+        order_number = normalize(order_number).lstrip('#').strip()
+        
+        # Known number -> id mapping
+        order_id, state = self.order_ids.get(order_number)
+        if state == FRESH:
+            order = await self.get_order(order_id)
+            if order:
+                return order
+        
+        # Numeric fast path: order numbers usually equal order ids
+        if order_number.isdigit():
+            order = await self.get_order(int(order_number))
+            if order and str(order.get('number', order.get('id'))) == order_number:
+                return order
+        
+        params = {
+            'search': order_number,
+            'per_page': 1
+        }
+        
+        orders = await self._make_request('orders', params=params)
+        
+        if orders and len(orders) > 0:
+            self._remember_order(orders[0])
+            return orders[0]
+        
+        logging.info(f"No order found with number: {order_number}")
+        return None
@@ -0,0 +1,15 @@
+import hmac
+import base64
+import hashlib
+from typing import Optional
+
+PRODUCT_TOPICS = {'product.created', 'product.updated', 'product.restored', 'product.deleted'}
+ORDER_TOPICS = {'order.created', 'order.updated', 'order.restored', 'order.deleted'}
+
+def verify_signature(body: bytes, signature: Optional[str], secret: str) -> bool:
+    """Check the X-WC-Webhook-Signature header (base64 HMAC-SHA256 of the raw body)"""
+    if not signature or not secret:
+        return False
+    digest = hmac.new(secret.encode('utf-8'), body, hashlib.sha256).digest()
+    expected = base64.b64encode(digest).decode('ascii')
+    return hmac.compare_digest(expected, signature.strip())